@@ -0,0 +1,184 @@
+import time
+
+from .ASTAR import ASTAR
+from .budget import CHECK_EVERY, Budget, SearchStopped
+from .frontier import Frontier
+from .stats import BOOKKEEPING, HEURISTIC, MOVEGEN
+
+# Mặc định: trọng số heuristic ban đầu, mức giảm mỗi vòng và thời gian chạy tối đa (giây)
+WEIGHT = 3.0
+WEIGHT_STEP = 0.5
+ANYTIME_LIMIT = 30
+
+
+class ARASTAR(ASTAR):
+    def __init__(self, grid, player_pos, boxes, goals, weightOfBox, weight=WEIGHT, step=WEIGHT_STEP):
+        """
+        Anytime Repairing A* (ARA*) trên cùng mô hình cost và heuristic với ASTAR (mode step).
+        Vòng đầu tìm với f = g + weight * h nên có lời giải nhanh, các vòng sau giảm weight đi step
+        và dùng lại g / parent đã có, chỉ mở rộng lại các state bị cải thiện (INCONS).
+        Hết budget (mặc định ANYTIME_LIMIT giây) thì trả về lời giải tốt nhất đã có.
+        self.bound: cost lời giải / cận dưới của cost tối ưu (1.0 = tối ưu).
+        """
+        super().__init__(grid, player_pos, boxes, goals, weightOfBox)
+        self.weight = weight
+        self.step = step
+        self.h = []  # id -> heuristic
+        self.closed = bytearray()  # id -> đã mở rộng trong vòng hiện tại
+        self.incons = set()  # state đã đóng nhưng g giảm, chờ vòng sau
+        self.best = None  # id của state đích tốt nhất
+        self.lower = 0  # cận dưới lớn nhất đã biết của cost tối ưu
+        self.bound = None
+        self.solutions = []  # mỗi lời giải tốt hơn đã công bố: (giây, cost, bound, số node)
+        self.budget = Budget(time_limit=ANYTIME_LIMIT)
+
+    def addState(self, h, player, boxes):
+        state_id = super().addState(h, player, boxes)
+        self.h.append(0)
+        self.closed.append(0)
+        return state_id
+
+    def bestCost(self):
+        return self.g[self.best] if self.best is not None else float("inf")
+
+    def openStates(self):
+        """Các state đang nằm trong OPEN (bỏ entry cũ và state đã đóng)."""
+        g = self.g
+        closed = self.closed
+        return {state_id for _, neg_g, state_id in self.pq.heap if -neg_g == g[state_id] and not closed[state_id]}
+
+    def publish(self, eps=None):
+        """Cập nhật bound: eps của vòng vừa xong, hoặc cost / min(g + h) trên OPEN ∪ INCONS."""
+        g = self.g
+        pending = self.openStates() | self.incons
+        lower = min((g[s] + self.h[s] for s in pending), default=self.bestCost())
+        self.lower = max(self.lower, min(lower, self.bestCost()))
+        bound = self.bestCost() / self.lower if self.lower > 0 else 1.0
+        if eps is not None:
+            bound = min(bound, eps)
+        self.bound = max(1.0, bound)
+        cost = self.bestCost()
+        if not self.solutions or self.solutions[-1][1] != cost:
+            self.solutions.append((time.perf_counter() - self.start_time, cost, self.bound, self.countNode))
+
+    def details(self):
+        details = super().details()
+        details["bound"] = self.bound
+        details["solutions"] = [list(solution) for solution in self.solutions]
+        return details
+
+    def improve(self, eps, h, player, boxes, new_g, parent_id, move, h_cost):
+        stats = self.stats
+        stats.generated += 1
+        stats.phase = BOOKKEEPING
+        state_id = self.visited.get(h, player, boxes)
+        if state_id is None:
+            state_id = self.addState(h, player, boxes)
+            self.g[state_id] = new_g
+            if callable(h_cost):
+                stats.phase = HEURISTIC
+                h_cost = h_cost()
+                stats.phase = BOOKKEEPING
+            self.h[state_id] = h_cost
+        elif new_g >= self.g[state_id]:
+            stats.duplicates += 1
+            return
+        else:
+            self.g[state_id] = new_g
+        self.parent[state_id] = parent_id
+        self.move[state_id] = move
+        if self.winning(boxes):
+            if new_g < self.bestCost():
+                self.best = state_id
+            return
+        if not self.closed[state_id]:
+            self.pq.push(state_id, new_g, eps * self.h[state_id])
+        elif eps <= 1:
+            # Vòng cuối mở lại state như ASTAR để lời giải chắc chắn tối ưu
+            self.closed[state_id] = 0
+            self.pq.push(state_id, new_g, self.h[state_id])
+        else:
+            self.incons.add(state_id)
+
+    def improvePath(self, eps):
+        board = self.board
+        stats = self.stats
+        pq = self.pq
+        while pq:
+            stats.phase = BOOKKEEPING
+            stats.frontier_peak = max(stats.frontier_peak, pq.peak)
+            if pq.heap[0][0] >= self.bestCost():
+                break
+            state_id = pq.pop()
+            if self.closed[state_id]:
+                continue
+            self.closed[state_id] = 1
+            self.countNode += 1
+            if self.budget is not None and not self.countNode % CHECK_EVERY:
+                self.budget.update(self.countNode, len(pq.heap))
+            h, player_pos, boxes = self.states[state_id]
+            g = self.g[state_id]
+            h_cost = self.h[state_id]
+            stats.expanded += 1
+            stats.phase = MOVEGEN
+            occupancy = board.occupancy(boxes)
+            for move, delta in board.moves.items():
+                newPlayer_pos = player_pos + delta
+                if not occupancy >> newPlayer_pos & 1:
+                    if self.isNextValid(newPlayer_pos):
+                        new_hash = board.walk_hash(h, player_pos, newPlayer_pos)
+                        self.improve(eps, new_hash, newPlayer_pos, boxes, g + 1, state_id, (move.lower(), 1), h_cost)
+                        stats.phase = MOVEGEN
+                else:
+                    newBox_pos = newPlayer_pos + delta
+                    if self.isNextValid(newPlayer_pos, occupancy, newBox_pos):
+                        if self.checkDeadlock(occupancy ^ (1 << newPlayer_pos) ^ (1 << newBox_pos), newBox_pos):
+                            continue
+                        group = board.group_at(boxes, newPlayer_pos)
+                        weight = board.group_weights[group]
+                        new_boxes = board.push(boxes, group, newPlayer_pos, newBox_pos)
+                        new_hash = board.push_hash(h, player_pos, group, newPlayer_pos, newBox_pos)
+                        self.improve(eps, new_hash, newPlayer_pos, new_boxes, g + weight, state_id, (move, weight),
+                                     lambda: self.MinimumCostFromBoxToGoal(new_boxes, boxes, newPlayer_pos, newBox_pos))
+                        stats.phase = MOVEGEN
+
+    def runner(self):
+        board = self.board
+        self.start_time = time.perf_counter()
+        self.stats.watch(frontier=lambda: len(self.pq.heap), visited=self.states.__len__)
+        start = self.addState(board.hash(self.player_pos, self.boxes), self.player_pos, self.boxes)
+        self.g[start] = 0
+        if self.winning(self.boxes):
+            self.bound = 1.0
+            return self.countNode, 0, ""
+        self.h[start] = self.MinimumCostFromBoxToGoal(self.boxes)
+        eps = self.weight
+        self.pq.push(start, 0, eps * self.h[start])
+        try:
+            while True:
+                # pq và closed được tạo lại mỗi vòng
+                self.stats.track(visited=(self.visited, self.states, self.g, self.h, self.closed),
+                                 frontier=(self.pq, self.incons), parents=(self.parent, self.move))
+                self.improvePath(eps)
+                if self.best is not None:
+                    self.publish(eps)
+                if eps <= 1 or self.bound == 1.0:
+                    break
+                # Giảm weight, đưa INCONS vào OPEN, sắp lại OPEN theo weight mới
+                eps = max(1.0, eps - self.step)
+                pending = self.openStates() | self.incons
+                self.incons = set()
+                self.closed = bytearray(len(self.states))
+                peak = self.pq.peak
+                self.pq = Frontier(self.g)
+                self.pq.peak = peak
+                for state_id in pending:
+                    self.pq.push(state_id, self.g[state_id], eps * self.h[state_id])
+        except SearchStopped:
+            if self.best is None:
+                raise
+            self.publish()
+        if self.best is None:
+            return self.countNode, 0, "NoSol"
+        result = self.buildPathToGoal(self.best)
+        return self.countNode, self.g[self.best], "".join(step for step, _ in result)
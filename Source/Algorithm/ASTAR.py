@@ -1,192 +1,281 @@
-from queue import PriorityQueue
-from scipy.optimize import linear_sum_assignment
-import numpy as np
+from collections import deque
 
-MOVE = {"U": (-1, 0), "D": (1, 0), "L": (0, -1), "R": (0, 1)}
+from .deadlock import is_freeze_deadlock
+from .frontier import Frontier
+from .heuristic import AssignmentHeuristic, push_distance_table
+from .budget import CHECK_EVERY
+from .state import Board, StateTable
+from .stats import BOOKKEEPING, DEAD_SQUARE, FREEZE, HEURISTIC, MOVEGEN, SearchStats
 
 
 class ASTAR:
-    def __init__(self, grid, player_pos, boxes, goals, weightOfBox):
+    def __init__(self, grid, player_pos, boxes, goals, weightOfBox, mode="step"):
+        """
+        mode="step": mỗi node là một bước đi của Ares (mặc định, tối ưu theo cost).
+        mode="push": mỗi node là một lần đẩy hộp, khoá theo (hộp, vùng Ares đi tới được).
+        """
         self.grid = grid
-        self.player_pos = player_pos
-        self.boxes = set(boxes)
+        self.mode = mode
+        self.board = Board(grid, player_pos, boxes, goals, weightOfBox)
+        self.player_pos = self.board.start_player
+        self.boxes = self.board.start_boxes
         self.goals = set(goals)
-        self.visited = {}  # = [g_cost,parrentState,move] , move = [cost,direction]
-        self.box_weights = dict(zip(boxes, weightOfBox))
-        self.pq = PriorityQueue()
+        self.goal_positions = [self.board.position(g) for g in self.board.goals]
+        # pushDistance[cell, j] = số lần đẩy ít nhất để đưa hộp từ cell tới goal j
+        self.pushDistance = push_distance_table(self.board)
+        self.heuristic = AssignmentHeuristic(self.board, self.pushDistance)
+        # visited[(hash, player, boxes)] = state id; mỗi state id có một ô trong các mảng bên dưới
+        self.visited = StateTable(self.board)
+        self.states = []  # id -> (hash, player, boxes)
+        self.g = []  # id -> g_cost tốt nhất
+        self.parent = []  # id -> id của state cha, -1 với state đầu
+        self.move = []  # id -> (direction, cost) ở mode step, (ô đứng để đẩy, direction) ở mode push
+        self.pq = Frontier(self.g)
         self.countNode = 0
+        self.stats = SearchStats()
+        self.budget = None  # Budget: giới hạn thời gian / node / bộ nhớ, huỷ khi chạy nền
 
-    def manhattan_distance(self, a, b):
-        return abs(a[0] - b[0]) + abs(a[1] - b[1])
+    def MinimumCostFromBoxToGoal(self, boxes, parent=None, src=None, dst=None):
+        """parent, src, dst: lần đẩy sinh ra boxes, để cập nhật phép gán từ node cha."""
+        return self.heuristic.bound(boxes, parent, src, dst)
 
-    def MinimumCostFromBoxToGoal(self, box_weight):
-        cost = []
-        for box, w in box_weight.items():
-            row_cost = []
-            for goal in self.goals:
-                row_cost.append(w * self.manhattan_distance(box, goal))
-            cost.append(row_cost)
-
-        np_cost = np.array(cost)
-        row_ind, col_ind = linear_sum_assignment(np_cost)
-        return np_cost[row_ind, col_ind].sum()
-
-    def checkDeadlock(self, boxes):
-        for x, y in boxes:
-            if (x, y) in self.goals:
-                continue
-
-            if self.grid[x - 1][y] == "#" and self.grid[x][y - 1] == "#":
-                return True
-            if self.grid[x + 1][y] == "#" and self.grid[x][y + 1] == "#":
-                return True
-            if self.grid[x - 1][y] == "#" and self.grid[x][y + 1] == "#":
-                return True
-            if self.grid[x + 1][y] == "#" and self.grid[x][y - 1] == "#":
-                return True
-
-            if (x, y + 1) in boxes:
-                if (x, y) in self.goals and (x, y + 1) in self.goals:
-                    continue
-                if self.grid[x - 1][y] == "#" and self.grid[x - 1][y + 1] == "#":
-                    return True
-                if self.grid[x + 1][y] == "#" and self.grid[x + 1][y + 1] == "#":
-                    return True
-            if (x + 1, y) in boxes:
-                if (x, y) in self.goals and (x + 1, y) in self.goals:
-                    continue
-                if self.grid[x][y - 1] == "#" and self.grid[x + 1][y - 1] == "#":
-                    return True
-                if self.grid[x][y + 1] == "#" and self.grid[x + 1][y + 1] == "#":
-                    return True
+    def details(self):
+        """Heuristic cache counters, on top of the shared ``self.stats``."""
+        heuristic = self.heuristic
+        calls = heuristic.hits + heuristic.misses
+        return {
+            "heuristic_hits": heuristic.hits,
+            "heuristic_misses": heuristic.misses,
+            "heuristic_incremental": heuristic.incremental,
+            "heuristic_hit_rate": heuristic.hits / calls if calls else 0.0,
+            "heuristic_time": heuristic.time,
+        }
 
+    def checkDeadlock(self, occupancy, box):
+        """Freeze deadlock around the box just pushed onto ``box``."""
+        if is_freeze_deadlock(self.board, occupancy, box):
+            self.stats.pruned[FREEZE] += 1
+            return True
         return False
 
-    def isNextValid(self, newPositionPlayer, box_pos=None, newPositionBox=None):
-        x, y = newPositionPlayer
-        if self.grid[x][y] == "#":
+    def isNextValid(self, newPositionPlayer, occupancy=0, newPositionBox=None):
+        if self.board.walls[newPositionPlayer]:
             return False
-        if not newPositionBox:
+        if newPositionBox is None:
             return True
-        x, y = newPositionBox
-        return self.grid[x][y] != "#" and (x, y) not in box_pos
+        board = self.board
+        if board.walls[newPositionBox] or occupancy >> newPositionBox & 1:
+            return False
+        if board.dead[newPositionBox]:
+            self.stats.pruned[DEAD_SQUARE] += 1
+            return False
+        return True
 
     def winning(self, boxes):
         """Checks if all boxes are on goal positions."""
-        return self.goals == boxes
+        return self.board.is_solved(boxes)
+
+    def addState(self, h, player, boxes):
+        state_id = len(self.states)
+        self.visited.put(h, player, boxes, state_id)
+        self.states.append((h, player, boxes))
+        self.g.append(float("inf"))
+        self.parent.append(-1)
+        self.move.append(None)
+        return state_id
 
-    def buildPathToGoal(self, State, initial_State):
+    def relax(self, h, player, boxes, new_g, parent_id, move):
+        """Id of the state if new_g improves it (it must then be pushed), else None."""
+        state_id = self.visited.get(h, player, boxes)
+        if state_id is None:
+            state_id = self.addState(h, player, boxes)
+        elif new_g >= self.g[state_id]:
+            return None
+        self.g[state_id] = new_g
+        self.parent[state_id] = parent_id
+        self.move[state_id] = move
+        return state_id
+
+    def buildPathToGoal(self, state_id):
         path = []
-        while State != initial_State:
-            data = self.visited.get(State)
-            if not data:
-                break
-            State = data[1]
-            path.append(data[2])
+        while self.parent[state_id] >= 0:
+            path.append(self.move[state_id])
+            state_id = self.parent[state_id]
         path.reverse()
         return path
 
+    def playerRegion(self, player, occupancy):
+        """
+        Flood fill vùng Ares đi tới được.
+        Trả về (dist, came_from, region): dist[c] = số bước tới c (-1 nếu không tới được),
+        came_from[c] = hướng đi vào c, region = ô nhỏ nhất trong vùng (đại diện chuẩn của vùng).
+        """
+        board = self.board
+        walls = board.walls
+        dist = [-1] * board.size
+        came_from = [None] * board.size
+        dist[player] = 0
+        region = player
+        queue = deque([player])
+        while queue:
+            c = queue.popleft()
+            for move, delta in board.moves.items():
+                n = c + delta
+                if dist[n] < 0 and not walls[n] and not occupancy >> n & 1:
+                    dist[n] = dist[c] + 1
+                    came_from[n] = move
+                    if n < region:
+                        region = n
+                    queue.append(n)
+        return dist, came_from, region
+
+    def walkPath(self, came_from, target):
+        path = []
+        while came_from[target] is not None:
+            move = came_from[target]
+            path.append(move.lower())
+            target -= self.board.moves[move]
+        path.reverse()
+        return "".join(path)
+
+    def buildPushPath(self, state_id):
+        """Nối lại đường đi: với mỗi lần đẩy, tìm lại đoạn đi bộ từ vị trí trước đó."""
+        board = self.board
+        segments = []
+        while self.parent[state_id] >= 0:
+            stand, move = self.move[state_id]
+            state_id = self.parent[state_id]
+            _, player, boxes = self.states[state_id]
+            _, came_from, _ = self.playerRegion(player, board.occupancy(boxes))
+            segments.append(self.walkPath(came_from, stand) + move)
+        segments.reverse()
+        return "".join(segments)
+
+    def pushRunner(self):
+        """
+        A* theo lần đẩy. Mỗi node được mở rộng bằng một lần flood fill, các con chỉ là
+        các lần đẩy hợp lệ. Node trùng (cùng hộp, cùng vùng của Ares) chỉ mở rộng một lần.
+        """
+        board = self.board
+        walls = board.walls
+        dead = board.dead
+        stats = self.stats
+        closed = StateTable(board)
+        stats.watch(frontier=lambda: len(self.pq.heap), visited=self.states.__len__)
+        stats.track(visited=(self.visited, closed, self.states, self.g), frontier=self.pq,
+                    parents=(self.parent, self.move))
+        start = self.addState(board.hash(self.player_pos, self.boxes), self.player_pos, self.boxes)
+        self.g[start] = 0
+        self.pq.push(start, 0, self.MinimumCostFromBoxToGoal(self.boxes))
+        while self.pq:
+            stats.phase = BOOKKEEPING
+            state_id = self.pq.pop()
+            h, player_pos, boxes = self.states[state_id]
+            g = self.g[state_id]
+            occupancy = board.occupancy(boxes)
+            stats.phase = MOVEGEN
+            dist, _, region = self.playerRegion(player_pos, occupancy)
+            region_hash = board.walk_hash(h, player_pos, region)
+            if closed.contains(region_hash, region, boxes):
+                continue
+            closed.add(region_hash, region, boxes)
+            self.countNode += 1
+            if self.budget is not None and not self.countNode % CHECK_EVERY:
+                self.budget.update(self.countNode, len(self.pq.heap))
+            if self.winning(boxes):
+                return [self.countNode, g, self.buildPushPath(state_id)]
+            stats.expanded += 1
+            for box in Board.cells(occupancy):
+                for move, delta in board.moves.items():
+                    stand = box - delta
+                    newBox_pos = box + delta
+                    if dist[stand] < 0 or walls[newBox_pos] or occupancy >> newBox_pos & 1:
+                        continue
+                    if dead[newBox_pos]:
+                        stats.pruned[DEAD_SQUARE] += 1
+                        continue
+                    if self.checkDeadlock(occupancy ^ (1 << box) ^ (1 << newBox_pos), newBox_pos):
+                        continue
+                    stats.generated += 1
+                    group = board.group_at(boxes, box)
+                    new_boxes = board.push(boxes, group, box, newBox_pos)
+                    new_hash = board.push_hash(board.walk_hash(h, player_pos, stand), stand, group, box, newBox_pos)
+                    new_g = g + dist[stand] + board.group_weights[group]
+                    stats.phase = BOOKKEEPING
+                    child = self.relax(new_hash, box, new_boxes, new_g, state_id, (stand, move))
+                    if child is None:
+                        stats.duplicates += 1
+                    else:
+                        stats.phase = HEURISTIC
+                        h_cost = self.MinimumCostFromBoxToGoal(new_boxes, boxes, box, newBox_pos)
+                        stats.phase = BOOKKEEPING
+                        self.pq.push(child, new_g, h_cost)
+                    stats.phase = MOVEGEN
+            stats.frontier_peak = self.pq.peak
+        return self.countNode, 0, "NoSol"
+
     def runner(self):
-        initial_State = (
-            self.player_pos,
-            tuple(sorted(self.box_weights.items())),
-        )
-        initial_heuristic = self.MinimumCostFromBoxToGoal(self.box_weights)
-        self.pq.put(
-            (
-                initial_heuristic,
-                0,
-                self.player_pos,
-                self.boxes.copy(),
-                tuple(sorted(self.box_weights.items())),
-            )
-        )
-        self.visited[initial_State] = [0, []]
-        while not self.pq.empty():
+        if self.mode == "push":
+            return self.pushRunner()
+        board = self.board
+        stats = self.stats
+        stats.watch(frontier=lambda: len(self.pq.heap), visited=self.states.__len__)
+        stats.track(visited=(self.visited, self.states, self.g), frontier=self.pq, parents=(self.parent, self.move))
+        start = self.addState(board.hash(self.player_pos, self.boxes), self.player_pos, self.boxes)
+        self.g[start] = 0
+        self.pq.push(start, 0, self.MinimumCostFromBoxToGoal(self.boxes))
+        while self.pq:
+            stats.phase = BOOKKEEPING
             self.countNode += 1
-            f, g, player_pos, boxes_pos, boxes_weights_tuple = self.pq.get()
-            boxes_weights = dict(boxes_weights_tuple)
-            current_state = (
-                player_pos,
-                tuple(sorted(boxes_weights.items())),
-            )
-            if self.winning(boxes_pos):
-                result = self.buildPathToGoal(current_state, initial_State)
+            if self.budget is not None and not self.countNode % CHECK_EVERY:
+                self.budget.update(self.countNode, len(self.pq.heap))
+            state_id = self.pq.pop()
+            h, player_pos, boxes = self.states[state_id]
+            g = self.g[state_id]
+            if self.winning(boxes):
+                result = self.buildPathToGoal(state_id)
                 sumCost = 0
                 step = ""
                 for i in result:
                     sumCost += i[1]
                     step += i[0]
                 return [self.countNode, sumCost, step]
-            if self.checkDeadlock(boxes_pos):
-                continue
-            for move, (dx, dy) in MOVE.items():
-                newPlayer_pos = (player_pos[0] + dx, player_pos[1] + dy)
-                if newPlayer_pos not in boxes_pos:
-                    new_State = (
-                        newPlayer_pos,
-                        tuple(sorted(boxes_weights.items())),
-                    )
-                    new_g = g + 1
+            stats.expanded += 1
+            stats.phase = MOVEGEN
+            occupancy = board.occupancy(boxes)
+            for move, delta in board.moves.items():
+                newPlayer_pos = player_pos + delta
+                if not occupancy >> newPlayer_pos & 1:
                     if self.isNextValid(newPlayer_pos):
-                        if new_State not in self.visited:
-                            self.visited[new_State] = [
-                                new_g,
-                                current_state,
-                                [move.lower(), 1],
-                            ]
-                            h_cost = self.MinimumCostFromBoxToGoal(boxes_weights)
-                            self.pq.put(
-                                (
-                                    new_g + h_cost,
-                                    new_g,
-                                    newPlayer_pos,
-                                    boxes_pos.copy(),
-                                    tuple(sorted(boxes_weights.items())),
-                                )
-                            )
-                        if new_g < self.visited[new_State][0]:
-                            self.visited[new_State] = [
-                                new_g,
-                                current_state,
-                                [move.lower(), 1],
-                            ]
+                        stats.generated += 1
+                        new_hash = board.walk_hash(h, player_pos, newPlayer_pos)
+                        stats.phase = BOOKKEEPING
+                        child = self.relax(new_hash, newPlayer_pos, boxes, g + 1, state_id, (move.lower(), 1))
+                        if child is None:
+                            stats.duplicates += 1
+                        else:
+                            self.pq.push(child, g + 1, self.MinimumCostFromBoxToGoal(boxes))
+                        stats.phase = MOVEGEN
                 else:
-                    newBox_pos = (newPlayer_pos[0] + dx, newPlayer_pos[1] + dy)
-
-                    if self.isNextValid(newPlayer_pos, boxes_pos, newBox_pos):
-                        new_boxes_weights = boxes_weights.copy()
-                        weight = new_boxes_weights.pop(newPlayer_pos)
-                        new_boxes_weights[newBox_pos] = weight
-                        new_boxes_pos = boxes_pos.copy()
-                        new_boxes_pos.remove(newPlayer_pos)
-                        new_boxes_pos.add(newBox_pos)
-
-                        new_State = (
-                            newPlayer_pos,
-                            tuple(sorted(new_boxes_weights.items())),
-                        )
-                        new_g = g + weight
-                        if new_State not in self.visited:
-                            self.visited[new_State] = [
-                                new_g,
-                                current_state,
-                                [move, weight],
-                            ]
-                            h_cost = self.MinimumCostFromBoxToGoal(new_boxes_weights)
-                            self.pq.put(
-                                (
-                                    new_g + h_cost,
-                                    new_g,
-                                    newPlayer_pos,
-                                    new_boxes_pos,
-                                    tuple(sorted(new_boxes_weights.items())),
-                                )
-                            )
-                        if new_g < self.visited[new_State][0]:
-                            self.visited[new_State] = [
-                                new_g,
-                                current_state,
-                                [move, weight],
-                            ]
-        return self.countNode, 0, "NoSol"
\ No newline at end of file
+                    newBox_pos = newPlayer_pos + delta
+
+                    if self.isNextValid(newPlayer_pos, occupancy, newBox_pos):
+                        if self.checkDeadlock(occupancy ^ (1 << newPlayer_pos) ^ (1 << newBox_pos), newBox_pos):
+                            continue
+                        stats.generated += 1
+                        group = board.group_at(boxes, newPlayer_pos)
+                        weight = board.group_weights[group]
+                        new_boxes = board.push(boxes, group, newPlayer_pos, newBox_pos)
+                        new_hash = board.push_hash(h, player_pos, group, newPlayer_pos, newBox_pos)
+                        stats.phase = BOOKKEEPING
+                        child = self.relax(new_hash, newPlayer_pos, new_boxes, g + weight, state_id, (move, weight))
+                        if child is None:
+                            stats.duplicates += 1
+                        else:
+                            stats.phase = HEURISTIC
+                            h_cost = self.MinimumCostFromBoxToGoal(new_boxes, boxes, newPlayer_pos, newBox_pos)
+                            stats.phase = BOOKKEEPING
+                            self.pq.push(child, g + weight, h_cost)
+                        stats.phase = MOVEGEN
+            stats.frontier_peak = self.pq.peak
+        return self.countNode, 0, "NoSol"
@@ -1,151 +1,168 @@
-import time
-import queue
+from .deadlock import is_freeze_deadlock
+from .budget import CHECK_EVERY, Budget
+from .parallel import parallel_bfs
+from .vectorized import BatchedBFS, fits
+from .state import Board, StateTable
+from .stats import BOOKKEEPING, DEAD_SQUARE, FREEZE, MOVEGEN, SearchStats
 
 TIME_LIMITED = 1800
-
-MOVE = {
-    'U': (-1, 0),
-    'D': (1, 0),
-    'L': (0, -1),
-    'R': (0, 1),
-}
+# Với workers > 1: chạy tuần tự trước đến ngần này node rồi giao tầng đang dở cho các worker.
+# Khởi động các process (spawn) mất cỡ 1 s, bằng thời gian bản tuần tự sinh chừng ấy node,
+# nên level nhỏ không đáng chạy song song
+PARALLEL_MIN_NODES = 100000
 
 class BFS:
-    def __init__(self, grid, player_pos, box_positions, goals, weight_of_boxes):
+    def __init__(self, grid, player_pos, box_positions, goals, weight_of_boxes, workers=1, backend="python"):
         """
         box_positions: list hoặc tuple các vị trí của hộp theo thứ tự (hộp i)
         weight_of_boxes: list các trọng lượng tương ứng cùng thứ tự
+        workers > 1: mở rộng từng tầng song song trên nhiều process (Algorithm/parallel.py),
+        cho ra đúng lời giải của bản tuần tự; level giải xong trong PARALLEL_MIN_NODES node vẫn chạy tuần tự
+        backend="numpy": mở rộng cả tầng bằng mảng NumPy (Algorithm/vectorized.py), kết quả y hệt
+        backend="python"
         """
         self.grid = grid
+        self.args = (grid, player_pos, box_positions, goals, weight_of_boxes)
+        self.workers = workers
+        self.backend = backend
+        self.board = Board(grid, player_pos, box_positions, goals, weight_of_boxes)
         self.n_boxes = len(box_positions)
         self.goals = set(goals)
-        # Lưu weights vào list, index tương ứng với box i
         self.weights = weight_of_boxes
-        # Tạo state khởi đầu
-        #   mỗi box i đang ở box_positions[i]
+        # Bộ đếm chung: node mở rộng / sinh ra, trùng, cắt tỉa theo loại deadlock...
+        self.stats = SearchStats()
+        # Số byte các worker process tăng thêm (chỉ khi chạy song song)
+        self.worker_memory = None
+        # (frontier, parents) khi solve(limit) dừng ở ranh giới tầng để giao cho các worker
+        self.handoff = None
+        # Giới hạn tài nguyên và cờ huỷ, mặc định chỉ giới hạn thời gian TIME_LIMITED
+        self.budget = Budget(time_limit=TIME_LIMITED)
+        # Tạo state khởi đầu: (player cell, box bitboard, total_weight, zobrist hash)
         self.start_state = (
-            player_pos,                       # (r, c) player
-            tuple(box_positions),             # ( (r0,c0), (r1,c1), ... )
-            0                                 # total_weight
+            self.board.start_player,
+            self.board.start_boxes,
+            0,
+            self.board.hash(self.board.start_player, self.board.start_boxes)
         )
 
-    def is_goal(self, box_positions_tuple):
+    def is_goal(self, boxes):
         """
         Kiểm tra nếu tất cả hộp đều nằm trong goals.
         """
-        return all(pos in self.goals for pos in box_positions_tuple)
+        return self.board.is_solved(boxes)
 
-    def is_deadlock(self, box_positions_tuple):
+    def is_deadlock(self, cell, occupancy):
         """
-        Deadlock cơ bản: nếu hộp không ở goal và bị kẹt góc 2 tường.
+        Ô chết: hộp bị đẩy vào đây không bao giờ tới được goal (tính sẵn một lần cho mỗi màn),
+        hoặc hộp vừa đẩy vào cell bị freeze cùng các hộp xung quanh.
+        occupancy: bitboard các hộp sau khi đẩy
         """
-        for (r, c) in box_positions_tuple:
-            if (r, c) not in self.goals:
-                # Kiểm tra 4 thế kẹt góc
-                if (
-                    (self.grid[r-1][c] == "#" and self.grid[r][c-1] == "#") or
-                    (self.grid[r-1][c] == "#" and self.grid[r][c+1] == "#") or
-                    (self.grid[r+1][c] == "#" and self.grid[r][c-1] == "#") or
-                    (self.grid[r+1][c] == "#" and self.grid[r][c+1] == "#")
-                ):
-                    return True
+        if self.board.dead[cell]:
+            self.stats.pruned[DEAD_SQUARE] += 1
+            return True
+        if is_freeze_deadlock(self.board, occupancy, cell):
+            self.stats.pruned[FREEZE] += 1
+            return True
         return False
 
-    def build_pos_to_index(self, box_positions_tuple):
-        """
-        Xây dict: pos -> chỉ số hộp
-        """
-        d = {}
-        for i, pos in enumerate(box_positions_tuple):
-            d[pos] = i
-        return d
-
-    def move_state(self, state, dx, dy):
+    def move_state(self, state, occupancy, delta):
         """
-        Thực hiện di chuyển (dx, dy). 
-        state = (player_pos, box_positions_tuple, total_weight)
+        Thực hiện di chuyển theo delta (độ lệch chỉ số ô).
+        state = (player, boxes, total_weight, hash), occupancy = bitboard mọi hộp
         Trả về (new_state, is_pushing) hoặc (None, False) nếu không di chuyển được.
         """
-        (player_pos, box_positions, total_w) = state
-        px, py = player_pos
+        (player, boxes, total_w, h) = state
+        board = self.board
 
-        new_px = px + dx
-        new_py = py + dy
+        new_player = player + delta
 
         # Check tường
-        if self.grid[new_px][new_py] == "#":
+        if board.walls[new_player]:
             return None, False
 
-        # Tạo dict vị trí -> chỉ số hộp
-        pos_to_idx = self.build_pos_to_index(box_positions)
-
         # Kiểm tra xem ô trước mặt có hộp không
-        if (new_px, new_py) in pos_to_idx:
-            # Có hộp
-            box_i = pos_to_idx[(new_px, new_py)]
+        if occupancy >> new_player & 1:
             # Vị trí mới của hộp
-            box_x = new_px + dx
-            box_y = new_py + dy
+            dest = new_player + delta
 
-            # Không thể đẩy vào tường hoặc hộp khác
-            if self.grid[box_x][box_y] == "#" or (box_x, box_y) in pos_to_idx:
+            # Không thể đẩy vào tường, hộp khác hoặc deadlock
+            if board.walls[dest] or occupancy >> dest & 1:
+                return None, False
+            if self.is_deadlock(dest, occupancy ^ (1 << new_player) ^ (1 << dest)):
                 return None, False
 
             # Tính cost đẩy
-            cost_push = self.weights[box_i]
-            new_total = total_w + cost_push
-
-            # Cập nhật vị trí hộp i
-            # box_positions là tuple, ta phải chuyển sang list để sửa
-            new_box_positions = list(box_positions)
-            new_box_positions[box_i] = (box_x, box_y)
-            new_box_positions = tuple(new_box_positions)
-
-            new_state = ((new_px, new_py), new_box_positions, new_total)
+            group = board.group_at(boxes, new_player)
+            new_total = total_w + board.group_weights[group]
+
+            new_state = (
+                new_player,
+                board.push(boxes, group, new_player, dest),
+                new_total,
+                board.push_hash(h, player, group, new_player, dest)
+            )
             return new_state, True
 
         else:
             # Di chuyển thường, không đẩy
-            new_state = ((new_px, new_py), box_positions, total_w)
+            new_state = (new_player, boxes, total_w, board.walk_hash(h, player, new_player))
             return new_state, False
 
     def reconstruct_path(self, parents, end_state):
         """
         Dựng đường đi từ end_state ngược về start_state
-        parents[s] = (parent_s, move_char)
+        parents[state] = (parent_state, move_char), start_state -> (None, "")
         """
         path = []
         current = end_state
-        while current in parents:
-            (p_state, move_c) = parents[current]
+        while True:
+            (p_state, move_c) = parents.get(current[3], current[0], current[1])
+            if p_state is None:
+                break
             path.append(move_c)
             current = p_state
         path.reverse()
         return "".join(path)
 
-    def solve(self):
-        start_time = time.time()
+    def solve(self, limit=None):
+        """
+        Trả về None nếu đã sinh limit node mà chưa xong. Khi đó dừng ở ranh giới tầng:
+        self.handoff = (frontier, parents), frontier là đúng tầng kế tiếp theo thứ tự FIFO.
+        """
+        board = self.board
+        stats = self.stats
 
         from collections import deque
         frontier = deque()
         frontier.append(self.start_state)
 
-        # visited: set các (player_pos, box_positions_tuple)
-        visited = set()
-        player_pos, box_positions, _ = self.start_state
-        visited.add((player_pos, box_positions))
-
-        # parents[state] = (parent_state, move_char)
-        parents = {}
+        # parents[state] = (parent_state, move_char), cũng dùng làm visited
+        parents = StateTable(board)
+        stats.watch(frontier=frontier.__len__, visited=parents.__len__)
+        stats.track(visited=parents, frontier=frontier)
+        player, boxes, _, h = self.start_state
+        parents.put(h, player, boxes, (None, ""))
 
         node_generated = 1
+        expanded = 0
+        # Số state của tầng hiện tại còn trong frontier
+        layer_left = 1
 
         while frontier:
-            if (time.time() - start_time) >= TIME_LIMITED:
-                return node_generated, 0, "TimeOut"
-
+            if not layer_left:
+                layer_left = len(frontier)
+                # Tầng có goal thì cứ tìm tiếp tuần tự, lời giải và bộ đếm y hệt khi không có worker
+                if (limit is not None and node_generated >= limit
+                        and not any(self.is_goal(state[1]) for state in frontier)):
+                    self.handoff = (frontier, parents)
+                    return None
+            stats.phase = BOOKKEEPING
             current_state = frontier.popleft()
-            (cur_player, cur_boxes, cur_weight) = current_state
+            layer_left -= 1
+            expanded += 1
+            if not expanded % CHECK_EVERY and self.budget is not None:
+                self.budget.update(node_generated, len(frontier))
+            (cur_player, cur_boxes, cur_weight, _) = current_state
 
             # Check goal
             if self.is_goal(cur_boxes):
@@ -153,29 +170,44 @@ class BFS:
                 sol = self.reconstruct_path(parents, current_state)
                 return node_generated, cur_weight, sol
 
+            stats.expanded += 1
+            occupancy = board.occupancy(cur_boxes)
+
             # Mở rộng 4 hướng
-            for move_key, (dx, dy) in MOVE.items():
-                new_state, is_pushing = self.move_state(current_state, dx, dy)
+            for move_key, delta in board.moves.items():
+                stats.phase = MOVEGEN
+                new_state, is_pushing = self.move_state(current_state, occupancy, delta)
                 if new_state is None:
                     continue
 
-                (n_player, n_boxes, n_weight) = new_state
-                # Deadlock?
-                if self.is_deadlock(n_boxes):
-                    continue
-
-                if (n_player, n_boxes) not in visited:
-                    visited.add((n_player, n_boxes))
+                stats.generated += 1
+                stats.phase = BOOKKEEPING
+                (n_player, n_boxes, n_weight, n_hash) = new_state
+                if parents.get(n_hash, n_player, n_boxes) is None:
                     node_generated += 1
                     # Quy ước ký tự di chuyển
                     move_char = move_key.upper() if is_pushing else move_key.lower()
 
-                    parents[new_state] = (current_state, move_char)
+                    parents.put(n_hash, n_player, n_boxes, (current_state, move_char))
                     frontier.append(new_state)
+                else:
+                    stats.duplicates += 1
+            if len(frontier) > stats.frontier_peak:
+                stats.frontier_peak = len(frontier)
 
         # Không tìm được lời giải
         return node_generated, 0, "NoSol"
     def runner(self):
+        if self.workers > 1:
+            result = self.solve(PARALLEL_MIN_NODES)
+            if result is not None:
+                return result
+            # Level lớn: các worker tìm tiếp từ tầng bản tuần tự dừng lại, bộ đếm cộng dồn
+            frontier, parents = self.handoff
+            self.handoff = None
+            return parallel_bfs(self, self.args, self.workers, frontier, parents)
+        if self.backend == "numpy" and fits(self.board):
+            return BatchedBFS(self).solve()
         return self.solve()
 
 def parse_grid(grid):
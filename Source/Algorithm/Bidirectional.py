@@ -0,0 +1,303 @@
+import heapq
+import math
+from collections import deque
+from itertools import combinations
+
+from .deadlock import is_freeze_deadlock
+from .budget import CHECK_EVERY
+from .state import Board, StateTable
+from .stats import BOOKKEEPING, DEAD_SQUARE, FREEZE, MOVEGEN, SearchStats
+
+
+class Side:
+    """Nodes of one search direction: best cost, parent and push per node id."""
+
+    def __init__(self, board):
+        self.table = StateTable(board)
+        self.states = []  # id -> (boxes, stand)
+        self.g = []
+        self.parent = []
+        self.move = []  # id -> push letter that leads to / out of the node
+        self.queue = []
+        self.expanded = 0
+
+
+class Bidirectional:
+    """
+    Bidirectional uniform-cost search over pushes.
+
+    A node is a pre-push state: a box configuration plus the cell the player
+    stands on to push. The forward side starts from the initial state and
+    pushes; the backward side starts from every goal configuration (each way
+    of putting the weight groups on the goals, with the player in any region
+    next to a box) and pulls. An edge costs the walk to the stand cell plus
+    the weight of the pushed box, the same cost UCS minimizes, so both sides
+    share one node set and meet on an identical state found through its
+    Zobrist hash (box configuration hash ^ stand cell). The search stops once
+    the two frontier minima add up to the best meeting cost, which is then
+    optimal. Like UCS, the reported cost is the pushed weight.
+    """
+
+    def __init__(self, grid, player_pos, boxes, goals, weightOfBox):
+        self.grid = grid
+        self.board = Board(grid, player_pos, boxes, goals, weightOfBox)
+        self.start_player = self.board.start_player
+        self.start_boxes = self.board.start_boxes
+        self.goals = set(goals)
+        self.stats = SearchStats()
+        self.goal_configs = 0
+        # Time / node / memory limits and cancellation, None = unlimited
+        self.budget = None
+
+    def details(self):
+        """Per-direction counts, on top of the shared ``self.stats``."""
+        return {
+            "forward_expanded": self.forward.expanded,
+            "backward_expanded": self.backward.expanded,
+            "forward_states": len(self.forward.states),
+            "backward_states": len(self.backward.states),
+            "goal_configs": self.goal_configs,
+        }
+
+    def box_hash(self, boxes):
+        board = self.board
+        return board.hash(0, boxes) ^ board.zobrist_player[0]
+
+    def walk_distances(self, start, occupancy):
+        """BFS from ``start`` around the boxes: (dist, came_from), dist[c] = -1 if unreachable."""
+        board = self.board
+        walls = board.walls
+        dist = [-1] * board.size
+        came_from = [None] * board.size
+        dist[start] = 0
+        queue = deque([start])
+        while queue:
+            c = queue.popleft()
+            for move, delta in board.moves.items():
+                n = c + delta
+                if dist[n] < 0 and not walls[n] and not occupancy >> n & 1:
+                    dist[n] = dist[c] + 1
+                    came_from[n] = move
+                    queue.append(n)
+        return dist, came_from
+
+    def walk(self, start, target, occupancy):
+        _, came_from = self.walk_distances(start, occupancy)
+        path = []
+        while target != start:
+            move = came_from[target]
+            path.append(move.lower())
+            target -= self.board.moves[move]
+        path.reverse()
+        return "".join(path)
+
+    def is_dead(self, occupancy, cell):
+        if self.board.dead[cell]:
+            self.stats.pruned[DEAD_SQUARE] += 1
+            return True
+        if is_freeze_deadlock(self.board, occupancy, cell):
+            self.stats.pruned[FREEZE] += 1
+            return True
+        return False
+
+    def goal_boxes(self):
+        """
+        Every distinct box bitboard with all boxes on goals. Boxes of one
+        weight group are interchangeable, so each group in turn takes a set
+        of the goals still free: no placement is enumerated twice.
+        """
+        board = self.board
+        configs = [(0, board.goals)]
+        for g, offset in enumerate(board.offsets):
+            count = board.box_group.count(g)
+            configs = [(boxes | sum(1 << (cell + offset) for cell in cells),
+                        tuple(cell for cell in free if cell not in cells))
+                       for boxes, free in configs
+                       for cells in combinations(free, count)]
+        return {boxes for boxes, _ in configs}
+
+    def relax(self, side, other, boxes, stand, box_hash, g, parent, move):
+        stats = self.stats
+        stats.generated += 1
+        stats.phase = BOOKKEEPING
+        h = box_hash ^ self.board.zobrist_player[stand]
+        node = side.table.get(h, stand, boxes)
+        if node is None:
+            node = len(side.states)
+            side.table.put(h, stand, boxes, node)
+            side.states.append((boxes, stand))
+            side.g.append(g)
+            side.parent.append(parent)
+            side.move.append(move)
+        elif g < side.g[node]:
+            side.g[node] = g
+            side.parent[node] = parent
+            side.move[node] = move
+        else:
+            stats.duplicates += 1
+            stats.phase = MOVEGEN
+            return
+        heapq.heappush(side.queue, (g, node))
+        # Hai phía gặp nhau tại cùng một trạng thái trước khi đẩy
+        match = other.table.get(h, stand, boxes)
+        if match is not None and g + other.g[match] < self.best:
+            self.best = g + other.g[match]
+            self.meeting = (node, match) if side is self.forward else (match, node)
+        stats.phase = MOVEGEN
+
+    def push_stands(self, boxes, occupancy, box_hash, dist, cost, parent):
+        """Forward nodes for every push the player can walk to, ``dist`` from its current cell."""
+        board = self.board
+        walls = board.walls
+        dead = board.dead
+        for box in Board.cells(occupancy):
+            for delta in board.moves.values():
+                stand = box - delta
+                dest = box + delta
+                if dist[stand] < 0 or walls[dest] or dead[dest] or occupancy >> dest & 1:
+                    continue
+                self.relax(self.forward, self.backward, boxes, stand, box_hash, cost + dist[stand], parent, None)
+
+    def expand_forward(self, node, g):
+        board = self.board
+        side = self.forward
+        boxes, stand = side.states[node]
+        occupancy = board.occupancy(boxes)
+        base_hash = self.box_hash(boxes)
+        for move, delta in board.moves.items():
+            box = stand + delta
+            dest = box + delta
+            if not occupancy >> box & 1 or board.walls[dest] or occupancy >> dest & 1:
+                continue
+            new_occupancy = occupancy ^ (1 << box) ^ (1 << dest)
+            if self.is_dead(new_occupancy, dest):
+                continue
+            group = board.group_at(boxes, box)
+            table = board.zobrist_box[group]
+            new_boxes = board.push(boxes, group, box, dest)
+            new_hash = base_hash ^ table[box] ^ table[dest]
+            dist, _ = self.walk_distances(box, new_occupancy)
+            cost = g + board.group_weights[group]
+            for next_box in Board.cells(new_occupancy):
+                for next_delta in board.moves.values():
+                    next_stand = next_box - next_delta
+                    next_dest = next_box + next_delta
+                    if (dist[next_stand] < 0 or board.walls[next_dest] or board.dead[next_dest]
+                            or new_occupancy >> next_dest & 1):
+                        continue
+                    self.relax(side, self.backward, new_boxes, next_stand, new_hash,
+                               cost + dist[next_stand], node, move)
+
+    def pulls(self, boxes, occupancy, box_hash, dist, cost, parent):
+        """
+        Backward nodes: every pull of a box next to a cell the player reaches (``dist``,
+        None = anywhere, for goal configurations). Pulling box ``c`` one cell back along
+        ``delta`` undoes a push from ``c - 2 * delta``.
+        """
+        board = self.board
+        walls = board.walls
+        for box in Board.cells(occupancy):
+            for move, delta in board.moves.items():
+                cell = box - delta
+                stand = cell - delta
+                if walls[cell] or occupancy >> cell & 1 or walls[stand] or occupancy >> stand & 1:
+                    continue
+                if dist is not None and dist[cell] < 0:
+                    continue
+                new_occupancy = occupancy ^ (1 << box) ^ (1 << cell)
+                if self.is_dead(new_occupancy, cell):
+                    continue
+                group = board.group_at(boxes, box)
+                table = board.zobrist_box[group]
+                new_boxes = board.push(boxes, group, box, cell)
+                walk = dist[cell] if dist is not None else 0
+                self.relax(self.backward, self.forward, new_boxes, stand, box_hash ^ table[box] ^ table[cell],
+                           cost + board.group_weights[group] + walk, parent, move)
+
+    def expand_backward(self, node, g):
+        boxes, stand = self.backward.states[node]
+        occupancy = self.board.occupancy(boxes)
+        dist, _ = self.walk_distances(stand, occupancy)
+        self.pulls(boxes, occupancy, self.box_hash(boxes), dist, g, node)
+
+    def build_path(self):
+        board = self.board
+        forward, backward = self.forward, self.backward
+        node, match = self.meeting
+        chain = []
+        while node >= 0:
+            chain.append(node)
+            node = forward.parent[node]
+        parts = []
+        player = self.start_player
+        for node in reversed(chain):
+            boxes, stand = forward.states[node]
+            move = forward.move[node]
+            if move is not None:
+                parts.append(move)
+                player += board.moves[move]
+            parts.append(self.walk(player, stand, board.occupancy(boxes)))
+            player = stand
+        # Phía ngược: mỗi node đẩy rồi đi tới ô đứng của node kế tiếp về phía goal
+        while match >= 0:
+            _, stand = backward.states[match]
+            move = backward.move[match]
+            parts.append(move)
+            player = stand + board.moves[move]
+            match = backward.parent[match]
+            if match >= 0:
+                boxes, stand = backward.states[match]
+                parts.append(self.walk(player, stand, board.occupancy(boxes)))
+        return "".join(parts)
+
+    def search(self):
+        board = self.board
+        if board.is_solved(self.start_boxes):
+            return 0, 0, ""
+        self.forward = forward = Side(board)
+        self.backward = backward = Side(board)
+        stats = self.stats
+        stats.watch(frontier=lambda: len(forward.queue) + len(backward.queue),
+                    visited=lambda: len(forward.states) + len(backward.states))
+        stats.track(visited=(forward.table, forward.states, forward.g, backward.table, backward.states, backward.g),
+                    frontier=(forward.queue, backward.queue),
+                    parents=(forward.parent, forward.move, backward.parent, backward.move))
+        self.best = math.inf
+        self.meeting = None
+
+        for boxes in self.goal_boxes():
+            self.goal_configs += 1
+            self.pulls(boxes, board.occupancy(boxes), self.box_hash(boxes), None, 0, -1)
+        occupancy = board.occupancy(self.start_boxes)
+        dist, _ = self.walk_distances(self.start_player, occupancy)
+        self.push_stands(self.start_boxes, occupancy, self.box_hash(self.start_boxes), dist, 0, -1)
+
+        expanded = 0
+        while forward.queue and backward.queue:
+            if forward.queue[0][0] + backward.queue[0][0] >= self.best:
+                break
+            # Mở rộng phía có frontier nhỏ hơn
+            side = forward if len(forward.queue) <= len(backward.queue) else backward
+            stats.phase = BOOKKEEPING
+            g, node = heapq.heappop(side.queue)
+            if g > side.g[node]:
+                continue
+            side.expanded += 1
+            expanded += 1
+            stats.expanded += 1
+            if len(forward.queue) + len(backward.queue) > stats.frontier_peak:
+                stats.frontier_peak = len(forward.queue) + len(backward.queue)
+            if self.budget is not None and not expanded % CHECK_EVERY:
+                self.budget.update(expanded, len(forward.queue) + len(backward.queue))
+            if side is forward:
+                self.expand_forward(node, g)
+            else:
+                self.expand_backward(node, g)
+
+        if self.meeting is None:
+            return expanded, 0, "NoSol"
+        path = self.build_path()
+        return expanded, board.push_weight(path), path
+
+    def runner(self):
+        return self.search()
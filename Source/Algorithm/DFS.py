@@ -1,105 +1,179 @@
-MOVE = {"U": (-1, 0), "D": (1, 0), "L": (0, -1), "R": (0, 1)}
+from .deadlock import is_freeze_deadlock
+from .budget import CHECK_EVERY
+from .state import Board, StateTable
+from .stats import BOOKKEEPING, DEAD_SQUARE, DEPTH, FREEZE, MOVEGEN, SearchStats
+
+
+DEPTH_STEP = 1
 
 
 class DFS:
-    def __init__(self, grid, player_pos, boxes, goals, weightOfBox):
+    def __init__(self, grid, player_pos, boxes, goals, weightOfBox, max_depth=None, iterative=False,
+                 depth_step=DEPTH_STEP):
+        """
+        max_depth: giới hạn độ sâu (số bước), None = không giới hạn.
+        iterative=True: iterative deepening, tăng giới hạn depth_step mỗi vòng tới max_depth,
+        lời giải có số bước ít nhất (sai lệch không quá depth_step - 1).
+        """
         self.grid = grid
-        self.player_pos = player_pos
-        self.boxes = set(boxes)
+        self.max_depth = max_depth
+        self.iterative = iterative
+        self.depth_step = depth_step
+        self.board = Board(grid, player_pos, boxes, goals, weightOfBox)
+        self.player_pos = self.board.start_player
+        self.boxes = self.board.start_boxes
         self.goals = set(goals)
-        self.visited = set()
-        self.box_weights = dict(zip((boxes), weightOfBox))
+        self.visited = StateTable(self.board)
         self.countNode = 0
+        self.stats = SearchStats()
+        self.path = []
+        self.costs = []
+        self.cutoff = False
+        self.budget = None  # Budget: giới hạn thời gian / node / bộ nhớ, huỷ khi chạy nền
 
-    def isNextValid(self, newPositionPlayer, newPositionBox=None):
-        [x, y] = newPositionPlayer
-        if self.grid[x][y] == "#":
+    def isNextValid(self, newPositionPlayer, occupancy, newPositionBox=None):
+        if self.board.walls[newPositionPlayer]:
             return False
-        if not newPositionBox:
+        if newPositionBox is None:
             return True
-        [x, y] = newPositionBox
-        if self.grid[x][y] != "#" and (x, y) not in self.boxes:
+        board = self.board
+        if board.walls[newPositionBox] or occupancy >> newPositionBox & 1:
+            return False
+        if board.dead[newPositionBox]:
+            self.stats.pruned[DEAD_SQUARE] += 1
+            return False
+        return True
+
+    def checkDeadlock(self, occupancy, box):
+        """Freeze deadlock around the box just pushed onto ``box``."""
+        if is_freeze_deadlock(self.board, occupancy, box):
+            self.stats.pruned[FREEZE] += 1
             return True
         return False
 
-    def checkDeadlock(self, boxes):
-        for x, y in boxes:
-            if (x, y) in self.goals:
-                continue
-
-            if self.grid[x - 1][y] == "#" and self.grid[x][y - 1] == "#":
-                return True
-            if self.grid[x + 1][y] == "#" and self.grid[x][y + 1] == "#":
-                return True
-            if self.grid[x - 1][y] == "#" and self.grid[x][y + 1] == "#":
-                return True
-            if self.grid[x + 1][y] == "#" and self.grid[x][y - 1] == "#":
-                return True
+    def dfs(self, max_depth=None):
+        """
+        DFS bằng stack tường minh, không đệ quy. Mỗi frame giữ vị trí Ares, hash, hướng thử tiếp theo
+        và bản ghi undo (group, ô cũ, ô mới) của lần đẩy dẫn tới nó; thùng được đẩy tại chỗ trên
+        self.boxes và đẩy ngược lại khi rút frame. Đường đi là hai stack song song moves / costs.
+        max_depth: không mở rộng node ở độ sâu max_depth (None = không giới hạn).
+        Trả về True nếu tìm được lời giải (nằm trong self.path / self.costs), ngược lại False.
+        """
+        board = self.board
+        stats = self.stats
+        visited = self.visited
+        walls = board.walls
+        dead = board.dead
+        weights = board.group_weights
+        directions = list(board.moves.items())
+        path = self.path = []
+        costs = self.costs = []
+        stats.watch(frontier=path.__len__, visited=visited.__len__)
+        stats.track(visited=visited, frontier=(path, costs))
+        self.cutoff = False
+        # visited lưu độ sâu nhỏ nhất đã gặp; không giới hạn độ sâu thì lưu 0 để gặp lại là bỏ
+        limited = max_depth is not None
 
-            if (x, y + 1) in boxes:
-                if (x, y) in self.goals and (x, y + 1) in self.goals:
+        player = self.player_pos
+        occupancy = board.occupancy(self.boxes)
+        stateHash = board.occupancy_hash(player, occupancy)
+        visited.put(stateHash, player, occupancy, 0)
+        self.countNode += 1
+        if board.is_solved(self.boxes):
+            return True
+        # frame: [player, hash, occupancy, hướng kế tiếp, undo]
+        stack = [[player, stateHash, occupancy, 0, None]]
+        while stack:
+            frame = stack[-1]
+            player, stateHash, occupancy, i, undo = frame
+            depth = len(path)
+            if i == 4 or (limited and depth >= max_depth):
+                if i < 4:
+                    self.cutoff = True
+                    stats.pruned[DEPTH] += 1
+                stack.pop()
+                if undo is not None:
+                    group, src, dst = undo
+                    self.boxes = board.push(self.boxes, group, dst, src)
+                if path:
+                    path.pop()
+                    costs.pop()
+                continue
+            frame[3] = i + 1
+            if not i:
+                stats.expanded += 1
+            stats.phase = MOVEGEN
+            move, delta = directions[i]
+            newPlayer = player + delta
+            if walls[newPlayer]:
+                continue
+            seen_depth = depth + 1 if limited else 0
+            if not occupancy >> newPlayer & 1:
+                newHash = board.walk_hash(stateHash, player, newPlayer)
+                stats.generated += 1
+                stats.phase = BOOKKEEPING
+                seen = visited.get(newHash, newPlayer, occupancy)
+                if seen is not None and seen <= seen_depth:
+                    stats.duplicates += 1
+                    continue
+                visited.put(newHash, newPlayer, occupancy, seen_depth)
+                stack.append([newPlayer, newHash, occupancy, 0, None])
+                path.append(move.lower())
+                costs.append(1)
+            else:
+                newBox = newPlayer + delta
+                if walls[newBox] or occupancy >> newBox & 1:
+                    continue
+                if dead[newBox]:
+                    stats.pruned[DEAD_SQUARE] += 1
                     continue
-                if self.grid[x - 1][y] == "#" and self.grid[x - 1][y + 1] == "#":
-                    return True
-                if self.grid[x + 1][y] == "#" and self.grid[x + 1][y + 1] == "#":
-                    return True
-            if (x + 1, y) in boxes:
-                if (x, y) in self.goals and (x + 1, y) in self.goals:
+                newOccupancy = occupancy ^ (1 << newPlayer) ^ (1 << newBox)
+                # visited bỏ qua trọng số nên hash theo nhóm 0
+                newHash = board.push_hash(stateHash, player, 0, newPlayer, newBox)
+                stats.phase = BOOKKEEPING
+                seen = visited.get(newHash, newPlayer, newOccupancy)
+                if seen is not None and seen <= seen_depth:
+                    stats.generated += 1
+                    stats.duplicates += 1
                     continue
-                if self.grid[x][y - 1] == "#" and self.grid[x + 1][y - 1] == "#":
-                    return True
-                if self.grid[x][y + 1] == "#" and self.grid[x + 1][y + 1] == "#":
-                    return True
+                stats.phase = MOVEGEN
+                if self.checkDeadlock(newOccupancy, newBox):
+                    continue
+                stats.generated += 1
+                stats.phase = BOOKKEEPING
+                visited.put(newHash, newPlayer, newOccupancy, seen_depth)
+                group = board.group_at(self.boxes, newPlayer)
+                self.boxes = board.push(self.boxes, group, newPlayer, newBox)
+                stack.append([newPlayer, newHash, newOccupancy, 0, (group, newPlayer, newBox)])
+                path.append(move)
+                costs.append(weights[group])
+            if len(path) > stats.frontier_peak:
+                stats.frontier_peak = len(path)
+            self.countNode += 1
+            if self.budget is not None and not self.countNode % CHECK_EVERY:
+                # DFS không có frontier, báo độ sâu hiện tại
+                self.budget.update(self.countNode, len(path))
+            if board.is_solved(self.boxes):
+                return True
         return False
 
-    def dfs(self, positionPlayer, road):
-        self.countNode += 1
-        if self.boxes == self.goals:
-            return road
-        if self.checkDeadlock(self.boxes):
-            return
-        for move, (dx, dy) in MOVE.items():
-            newPositionPlayer = [positionPlayer[0] + dx, positionPlayer[1] + dy]
-            if (newPositionPlayer[0], newPositionPlayer[1]) not in self.boxes:
-                new_State = (tuple(newPositionPlayer), tuple(sorted(self.boxes)))
-                if (
-                    self.isNextValid(newPositionPlayer)
-                    and new_State not in self.visited
-                ):
-                    self.visited.add(new_State)
-                    result = self.dfs(newPositionPlayer, road + [[move.lower(), 1]])
-                    if result:
-                        return result
-            else:
-                newPositionBox = [newPositionPlayer[0] + dx, newPositionPlayer[1] + dy]
-                if self.isNextValid(newPositionPlayer, newPositionBox):
-                    self.boxes.remove((newPositionPlayer[0], newPositionPlayer[1]))
-                    self.boxes.add((newPositionBox[0], newPositionBox[1]))
-                    new_State = (tuple(newPositionPlayer), tuple(sorted(self.boxes)))
-                    if new_State not in self.visited:
-                        self.visited.add(new_State)
-                        old_box_pos = tuple(newPositionPlayer)
-                        cost = self.box_weights[old_box_pos]
-                        self.box_weights.pop(old_box_pos)
-                        self.box_weights[tuple(newPositionBox)] = cost
-                        result = self.dfs(newPositionPlayer, road + [[move, cost]])
-                        if result:
-                            return result
-                        self.box_weights.pop(tuple(newPositionBox))
-                        self.box_weights[old_box_pos] = cost
-                    self.boxes.remove((newPositionBox[0], newPositionBox[1]))
-                    self.boxes.add((newPositionPlayer[0], newPositionPlayer[1]))
-        return None
-
     def runner(self):
-        self.visited.add((tuple(self.player_pos), tuple(sorted(self.boxes))))
-        result = self.dfs(self.player_pos, [])
-        sumCost = 0
-        step = ""
-        if result == None:
+        # DFS không tối ưu cost nên visited chỉ cần vị trí hộp, không cần trọng số
+        if not self.iterative:
+            found = self.dfs(self.max_depth)
+        else:
+            # Iterative deepening: tăng giới hạn độ sâu tới khi có lời giải hoặc không còn nhánh bị cắt
+            limit = 0
+            found = False
+            while not found and (self.max_depth is None or limit < self.max_depth):
+                limit += self.depth_step
+                if self.max_depth is not None:
+                    limit = min(limit, self.max_depth)
+                self.visited = StateTable(self.board)
+                self.boxes = self.board.start_boxes
+                found = self.dfs(limit)
+                if not found and not self.cutoff:
+                    break
+        if not found:
             return self.countNode, 0, "NoSol"
-        for i in result:
-            sumCost += i[1]
-            step += i[0]
-        if result:
-            return [self.countNode, sumCost, step]
\ No newline at end of file
+        return [self.countNode, sum(self.costs), "".join(self.path)]
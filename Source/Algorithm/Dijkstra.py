@@ -1,115 +1,107 @@
 import heapq
 import math
-from collections import deque
 
-MOVE = {
-    "U": (-1, 0),
-    "D": (1, 0),
-    "L": (0, -1),
-    "R": (0, 1)
-}
+from .deadlock import is_freeze_deadlock
+from .budget import CHECK_EVERY
+from .state import Board, SearchTree, StateTable
+from .stats import BOOKKEEPING, DEAD_SQUARE, FREEZE, MOVEGEN, SearchStats
+
 
 class Dijkstra:
     def __init__(self, grid, player_pos, boxes, goals, weightOfBox):
         self.grid = grid
-        self.start_player = tuple(player_pos)
-        self.start_boxes = tuple(sorted(boxes))
+        self.board = Board(grid, player_pos, boxes, goals, weightOfBox)
+        self.start_player = self.board.start_player
+        self.start_boxes = self.board.start_boxes
         self.goals = set(goals)
-        d = dict(zip(boxes, weightOfBox))
-        self.start_box_weights = frozenset(d.items())
+        self.stats = SearchStats()
+        # Every reachability query is for a cell next to the player
+        self.steps = frozenset(self.board.moves.values())
+        # Time / node / memory limits and cancellation, None = unlimited
+        self.budget = None
 
-    def is_wall(self, x, y):
-        if not (0 <= x < len(self.grid) and 0 <= y < len(self.grid[0])):
-            return True
-        return self.grid[x][y] == "#"
+    def is_wall(self, cell):
+        return self.board.walls[cell]
 
-    def can_player_reach(self, start, target, boxes_set):
+    def can_player_reach(self, start, target, occupancy):
         if start == target:
             return True
-        visited = set()
-        visited.add(start)
-        queue = deque([start])
-        while queue:
-            cx, cy = queue.popleft()
-            for dx, dy in MOVE.values():
-                nx, ny = cx + dx, cy + dy
-                if 0 <= nx < len(self.grid) and 0 <= ny < len(self.grid[0]):
-                    if not self.is_wall(nx, ny) and (nx, ny) not in boxes_set:
-                        if (nx, ny) not in visited:
-                            if (nx, ny) == target:
-                                return True
-                            visited.add((nx, ny))
-                            queue.append((nx, ny))
-        return False
+        # One step away: no flood fill needed
+        return target - start in self.steps and not self.is_wall(target) and not occupancy >> target & 1
 
-    def is_deadlock(self, boxes_set):
-        for box in boxes_set:
-            if box in self.goals:
-                continue
-            x, y = box
-            if ((self.is_wall(x-1, y) and self.is_wall(x, y-1)) or
-                (self.is_wall(x-1, y) and self.is_wall(x, y+1)) or
-                (self.is_wall(x+1, y) and self.is_wall(x, y-1)) or
-                (self.is_wall(x+1, y) and self.is_wall(x, y+1))):
-                return True
+    def is_deadlock(self, cell, occupancy):
+        if self.board.dead[cell]:
+            self.stats.pruned[DEAD_SQUARE] += 1
+            return True
+        if is_freeze_deadlock(self.board, occupancy, cell):
+            self.stats.pruned[FREEZE] += 1
+            return True
         return False
 
     def dijkstra(self):
-        start_state = (self.start_player, self.start_boxes, self.start_box_weights)
-        pq = [(0, start_state, "", 0)]
-        best_cost = {start_state: 0}
+        board = self.board
+        start_hash = board.hash(self.start_player, self.start_boxes)
+        # Paths live in the tree (parent + one move byte), rebuilt only at the goal
+        tree = SearchTree()
+        pq = [(0, self.start_player, self.start_boxes, tree.add(-1, ""), start_hash)]
+        best_cost = StateTable(board)
+        best_cost.put(start_hash, self.start_player, self.start_boxes, 0)
         node_generated = 0
+        stats = self.stats
+        stats.watch(frontier=pq.__len__, visited=best_cost.__len__)
+        stats.track(visited=best_cost, frontier=pq, parents=tree)
 
         while pq:
-            cost, (player, boxes_tuple, box_weights_fro), path, total_weight = heapq.heappop(pq)
+            stats.phase = BOOKKEEPING
+            cost, player, boxes, node, h = heapq.heappop(pq)
             node_generated += 1
+            if self.budget is not None and not node_generated % CHECK_EVERY:
+                self.budget.update(node_generated, len(pq))
 
-            if cost > best_cost[(player, boxes_tuple, box_weights_fro)]:
-                continue
-
-            boxes_set = set(boxes_tuple)
-
-            if self.is_deadlock(boxes_set):
+            if cost > best_cost.get(h, player, boxes):
                 continue
 
-            if boxes_set == self.goals:
-                return node_generated, total_weight, path
+            occupancy = board.occupancy(boxes)
 
-            box_weights = dict(box_weights_fro)
-            px, py = player
+            if board.is_solved(boxes):
+                path = tree.path(node)
+                return node_generated, board.push_weight(path), path
 
-            for mv, (dx, dy) in MOVE.items():
-                nx, ny = px + dx, py + dy
-                if (nx, ny) not in boxes_set and not self.is_wall(nx, ny):
-                    if self.can_player_reach((px, py), (nx, ny), boxes_set):
+            stats.expanded += 1
+            for mv, delta in board.moves.items():
+                stats.phase = MOVEGEN
+                nxt = player + delta
+                if not occupancy >> nxt & 1 and not self.is_wall(nxt):
+                    if self.can_player_reach(player, nxt, occupancy):
+                        stats.generated += 1
                         new_cost = cost + 1
-                        new_state = ((nx, ny), boxes_tuple, box_weights_fro)
-                        if new_cost < best_cost.get(new_state, math.inf):
-                            best_cost[new_state] = new_cost
-                            new_path = path + mv.lower()
-                            heapq.heappush(pq, (new_cost, new_state, new_path, total_weight))
-                elif (nx, ny) in boxes_set:
-                    bx, by = nx + dx, ny + dy
-                    if (bx, by) not in boxes_set and not self.is_wall(bx, by):
-                        if self.can_player_reach((px, py), (nx, ny), boxes_set - {(nx, ny)}):
-                            w = box_weights.get((nx, ny), 0)
+                        new_hash = board.walk_hash(h, player, nxt)
+                        stats.phase = BOOKKEEPING
+                        if new_cost < best_cost.get(new_hash, nxt, boxes, math.inf):
+                            best_cost.put(new_hash, nxt, boxes, new_cost)
+                            heapq.heappush(pq, (new_cost, nxt, boxes, tree.add(node, mv.lower()), new_hash))
+                        else:
+                            stats.duplicates += 1
+                elif occupancy >> nxt & 1:
+                    dest = nxt + delta
+                    if (not occupancy >> dest & 1 and not self.is_wall(dest)
+                            and not self.is_deadlock(dest, occupancy ^ (1 << nxt) ^ (1 << dest))):
+                        if self.can_player_reach(player, nxt, occupancy & ~(1 << nxt)):
+                            stats.generated += 1
+                            group = board.group_at(boxes, nxt)
+                            w = board.group_weights[group]
                             new_cost = cost + w
-                            new_boxes = set(boxes_set)
-                            new_boxes.remove((nx, ny))
-                            new_boxes.add((bx, by))
-                            new_boxes_tuple = tuple(sorted(new_boxes))
-                            new_dict = dict(box_weights)
-                            if (nx, ny) in new_dict:
-                                tmp = new_dict.pop((nx, ny))
-                                new_dict[(bx, by)] = tmp
-                            nw_fro = frozenset(new_dict.items())
-                            new_state = ((nx, ny), new_boxes_tuple, nw_fro)
-                            new_total_weight = total_weight + w
-                            if new_cost < best_cost.get(new_state, math.inf):
-                                best_cost[new_state] = new_cost
-                                new_path = path + mv.upper()
-                                heapq.heappush(pq, (new_cost, new_state, new_path, new_total_weight))
+                            new_boxes = board.push(boxes, group, nxt, dest)
+                            new_hash = board.push_hash(h, player, group, nxt, dest)
+                            stats.phase = BOOKKEEPING
+                            if new_cost < best_cost.get(new_hash, nxt, new_boxes, math.inf):
+                                best_cost.put(new_hash, nxt, new_boxes, new_cost)
+                                heapq.heappush(pq, (new_cost, nxt, new_boxes, tree.add(node, mv.upper()), new_hash))
+                            else:
+                                stats.duplicates += 1
+            if len(pq) > stats.frontier_peak:
+                stats.frontier_peak = len(pq)
         return node_generated, 0, "NoSol"
 
     def runner(self):
-        return self.dijkstra()
+        return self.dijkstra()
\ No newline at end of file
@@ -1,209 +1,184 @@
-import heapq  
-from collections import deque  
-MOVE = {
-    "U": (-1, 0), "D": (1, 0), "L": (0, -1), "R": (0, 1),
-    "u": (-1, 0), "d": (1, 0), "l": (0, -1), "r": (0, 1)
-} 
-
-class GBFS:  
-    def __init__(self, grid, player_pos, boxes, goals, weightOfBox):  
-        self.grid = grid  
-        self.player_pos = player_pos  
-        self.boxes = set(boxes)  
-        self.goals = set(goals)  
-        self.nodes_generated = 0  
-        
-        # Associate weights with boxes  
-        if isinstance(weightOfBox, list) and len(weightOfBox) == len(boxes):  
-            self.weightOfBox = {box: weight for box, weight in zip(boxes, weightOfBox)}  
-        else:  
-            print("Warning: Weight mismatch, using default weights")  
-            self.weightOfBox = {box: 1 for box in boxes}  
-        
-        # Track each box's original position  
-        self.box_origins = {box: box for box in boxes}  
-        
-        # Pre-calculate deadlock positions to avoid  
-        self.deadlock_positions = self.identify_deadlocks()  
-    
-    def identify_deadlocks(self):  
-        deadlocks = set()  
-        rows, cols = len(self.grid), len(self.grid[0])  
-
-        for r in range(rows):  
-            for c in range(cols):  
-                if not self.is_wall(r, c) and (r, c) not in self.goals:  
-                    if ((self.is_wall(r-1, c) and self.is_wall(r, c-1)) or  
-                        (self.is_wall(r-1, c) and self.is_wall(r, c+1)) or  
-                        (self.is_wall(r+1, c) and self.is_wall(r, c-1)) or  
-                        (self.is_wall(r+1, c) and self.is_wall(r, c+1))):  
-                        deadlocks.add((r, c))  
-
-        return deadlocks  
-    
-    def is_wall(self, x, y):  
-        if not (0 <= x < len(self.grid) and 0 <= y < len(self.grid[0])):  
-            return True  
-        return self.grid[x][y] == "#"  
-    
-    def is_next_valid(self, player_pos, box_pos=None):  
-        px, py = player_pos  
-        if self.is_wall(px, py):  
-            return False  
-        if box_pos is not None:  
-            bx, by = box_pos  
-            if self.is_wall(bx, by) or (bx, by) in self.boxes or (bx, by) in self.deadlock_positions:  
-                return False  
-        return True  
-    
-    def is_solved(self, boxes):  
-        return boxes.issubset(self.goals) and len(boxes) == len(self.goals)  
-    
-    def manhattan_distance(self, a, b):  
-        return abs(a[0] - b[0]) + abs(a[1] - b[1])  
-    
-    def can_reach(self, start, target, boxes):  
-        if start == target:  
-            return True  
-        
-        queue = deque([start])  
-        visited = {start}  
-        
-        while queue:  
-            pos = queue.popleft()  
-            px, py = pos  
-            
-            for _, (dx, dy) in MOVE.items():  
-                new_pos = (px + dx, py + dy)  
-                
-                if (new_pos not in visited and   
-                    not self.is_wall(*new_pos) and   
-                    new_pos not in boxes):  
-                    if new_pos == target:  
-                        return True  
-                    visited.add(new_pos)  
-                    queue.append(new_pos)  
-        
-        return False  
-    
-    def calculate_heuristic(self, boxes):  
-        if not boxes or not self.goals:  
-            return float('inf')  
-
-        total = 0  
-        remaining_goals = list(self.goals)  
-
-        for box in boxes:  
-            if box in self.goals:  
-                if box in remaining_goals:  
-                    remaining_goals.remove(box)  
-                total += 0  
-            else:  
-                if remaining_goals:  
-                    closest_dist = min(self.manhattan_distance(box, goal) for goal in remaining_goals)  
-                    closest_goal = min(remaining_goals, key=lambda g: self.manhattan_distance(box, g))  
-                    total += closest_dist  
-                    if closest_goal in remaining_goals:  
-                        remaining_goals.remove(closest_goal)  
-                else:  
-                    total += 99  
-
-        return total  
-    
-    def gbfs(self):  
-        priority_queue = []  
-        initial_heuristic = self.calculate_heuristic(self.boxes)  
-        
-        initial_state = (initial_heuristic, 0, self.player_pos, frozenset(self.boxes), [])  
-        
-        heapq.heappush(priority_queue, initial_state)  
-        visited = set()  
-        self.nodes_generated = 1  
-        total_weight = 0  # Khởi tạo tổng trọng lượng  
-        max_iterations = 500000  
-        
-        while priority_queue and self.nodes_generated < max_iterations:  
-            current_heuristic, steps, player_pos, boxes_frozen, path = heapq.heappop(priority_queue)  
-            boxes = set(boxes_frozen)  
-
-            if self.is_solved(boxes):  
-                # Tính toán tổng trọng lượng từ các bước đẩy thùng  
-                total_weight = sum(move_info[2] for move_info in path if move_info[1])  
-                return path, total_weight  # Trả về path và total_weight  
-            
-            # Tạo khóa trạng thái cho tập visited  
-            state_key = (player_pos, boxes_frozen)  
-            if state_key in visited:  
-                continue  
-            
-            visited.add(state_key)  
-            
-            # Thử từng bước di chuyển có thể  
-            px, py = player_pos  
-            for move, (dx, dy) in MOVE.items():  
-                new_pos = (px + dx, py + dy)  
-                new_box_pos = (new_pos[0] + dx, new_pos[1] + dy)  
-                
-                # Trường hợp 1: Di chuyển vào không gian trống - không đẩy thùng  
-                if new_pos not in boxes and not self.is_wall(*new_pos):  
-                    # Thêm bước di chuyển vào path  
-                    new_path = path + [[move, False, 1]]  # Weight cho di chuyển thường là 1  
-                    new_state = (self.calculate_heuristic(boxes), steps + 1, new_pos, boxes_frozen, new_path)  
-                    
-                    new_state_key = (new_pos, boxes_frozen)  
-                    if new_state_key not in visited:  
-                        heapq.heappush(priority_queue, new_state)  
-                        self.nodes_generated += 1  
-                
-                # Trường hợp 2: Di chuyển và đẩy thùng  
-                elif new_pos in boxes and not self.is_wall(*new_box_pos) and new_box_pos not in boxes:  
-                    # Kiểm tra xem vị trí mới có phải là điểm chết hay không, hoặc có phải là mục tiêu  
-                    if new_box_pos not in self.deadlock_positions or new_box_pos in self.goals:  
-                        # Cập nhật vị trí của thùng  
-                        new_boxes = set(boxes)  
-                        old_box_pos = new_pos  # Vị trí cũ của thùng  
-                        new_boxes.remove(old_box_pos)  
-                        new_boxes.add(new_box_pos)  
-                        
-                        # Lấy trọng lượng của thùng dựa vào vị trí ban đầu  
-                        original_box_pos = self.box_origins[old_box_pos]  
-                        box_weight = self.weightOfBox.get(original_box_pos, 1)  
-                        
-                        # Cập nhật vị trí ban đầu của thùng  
-                        self.box_origins[new_box_pos] = original_box_pos  
-                        
-                        new_boxes_frozen = frozenset(new_boxes)  
-                        # Thêm bước đẩy vào path với trọng lượng  
-                        new_path = path + [[move, True, box_weight]]  
-                        
-                        # Tính toán heuristic mới  
-                        new_heuristic = self.calculate_heuristic(new_boxes)  
-                        new_state = (new_heuristic, steps + 1, new_pos, new_boxes_frozen, new_path)  
-                        
-                        new_state_key = (new_pos, new_boxes_frozen)  
-                        if new_state_key not in visited:  
-                            heapq.heappush(priority_queue, new_state)  
-                            self.nodes_generated += 1  
-        return None, 0    
-    
-    def runner(self):  
-        try:  
-            result, total_weight = self.gbfs()  
-            if result:  
-                # Chuyển đổi result sang dạng chuỗi các bước  
-                solution = []  
-                for move_info in result:  
-                    move, is_push, weight = move_info  
-                    if is_push:  
-                        solution.append(move.upper())  # Đẩy thùng: chữ hoa  
-                    else:  
-                        solution.append(move.lower())  # Di chuyển thường: chữ thường  
-                solution_str = ''.join(solution)  
-                return self.nodes_generated, total_weight, solution_str  
-            else:  
-                return None, 0, "NoSol"  
-        except Exception as e:  
-            print(f"Error in GBFS runner: {e}")  
-            import traceback  
-            traceback.print_exc()  
-            return None, 0, "NoSol"
\ No newline at end of file
+import heapq
+
+from .deadlock import is_freeze_deadlock
+from .budget import CHECK_EVERY, Budget, SearchStopped
+from .state import Board, SearchTree, StateTable
+from .stats import BOOKKEEPING, DEAD_SQUARE, FREEZE, HEURISTIC, MOVEGEN, SearchStats
+
+MAX_NODES = 500000
+
+
+class GBFS:
+    def __init__(self, grid, player_pos, boxes, goals, weightOfBox):
+        self.grid = grid
+        self.goals = set(goals)
+        self.nodes_generated = 0
+        self.stats = SearchStats()
+
+        # Associate weights with boxes
+        if not (isinstance(weightOfBox, list) and len(weightOfBox) == len(boxes)):
+            print("Warning: Weight mismatch, using default weights")
+            weightOfBox = [1] * len(boxes)
+        # Board giữ trọng lượng theo nhóm nên thùng luôn mang đúng trọng lượng khi bị đẩy
+        self.board = Board(grid, player_pos, boxes, goals, weightOfBox)
+        self.player_pos = self.board.start_player
+        self.boxes = self.board.start_boxes
+        self.goal_positions = [self.board.position(g) for g in self.board.goals]
+
+        # Deadlock positions to avoid, pre-calculated once per level by the Board
+        self.deadlock_positions = self.board.dead
+        # Giới hạn tài nguyên và cờ huỷ, mặc định tối đa MAX_NODES node
+        self.budget = Budget(max_nodes=MAX_NODES)
+
+    def is_wall(self, cell):
+        if not 0 <= cell < self.board.size:
+            return True
+        return self.board.walls[cell]
+
+    def is_next_valid(self, player_pos, occupancy, box_pos=None):
+        if self.is_wall(player_pos):
+            return False
+        if box_pos is not None:
+            if self.is_wall(box_pos) or occupancy >> box_pos & 1 or self.deadlock_positions[box_pos]:
+                return False
+        return True
+
+    def is_solved(self, boxes):
+        return self.board.is_solved(boxes)
+
+    def manhattan_distance(self, a, b):
+        return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+    def calculate_heuristic(self, occupancy):
+        if not occupancy or not self.goals:
+            return float('inf')
+
+        total = 0
+        remaining_goals = list(self.goal_positions)
+
+        for cell in Board.cells(occupancy):
+            box = self.board.position(cell)
+            if box in self.goals:
+                if box in remaining_goals:
+                    remaining_goals.remove(box)
+                total += 0
+            else:
+                if remaining_goals:
+                    closest_dist = min(self.manhattan_distance(box, goal) for goal in remaining_goals)
+                    closest_goal = min(remaining_goals, key=lambda g: self.manhattan_distance(box, g))
+                    total += closest_dist
+                    if closest_goal in remaining_goals:
+                        remaining_goals.remove(closest_goal)
+                else:
+                    total += 99
+
+        return total
+
+    def gbfs(self):
+        board = self.board
+        priority_queue = []
+        initial_heuristic = self.calculate_heuristic(board.occupancy(self.boxes))
+
+        initial_hash = board.occupancy_hash(self.player_pos, board.occupancy(self.boxes))
+        # Mỗi node chỉ giữ id trong tree (cha + 1 byte nước đi) thay vì bản sao cả path
+        tree = SearchTree()
+        initial_state = (initial_heuristic, 0, self.player_pos, self.boxes, initial_hash, tree.add(-1, ""))
+
+        heapq.heappush(priority_queue, initial_state)
+        visited = StateTable(board)
+        self.nodes_generated = 1
+        expanded = 0
+        stats = self.stats
+        stats.watch(frontier=priority_queue.__len__, visited=visited.__len__)
+        stats.track(visited=visited, frontier=priority_queue, parents=tree)
+
+        while priority_queue:
+            stats.phase = BOOKKEEPING
+            current_heuristic, steps, player_pos, boxes, state_hash, node = heapq.heappop(priority_queue)
+            occupancy = board.occupancy(boxes)
+            expanded += 1
+            if self.budget is not None and not expanded % CHECK_EVERY:
+                self.budget.update(self.nodes_generated, len(priority_queue))
+
+            if self.is_solved(boxes):
+                # Dựng path một lần rồi tính tổng trọng lượng từ các bước đẩy thùng
+                path = tree.path(node)
+                return path, board.push_weight(path)  # Trả về path và total_weight
+
+            # visited theo (player, occupancy): GBFS không tối ưu cost nên bỏ qua trọng số
+            if visited.contains(state_hash, player_pos, occupancy):
+                continue
+
+            visited.add(state_hash, player_pos, occupancy)
+            stats.expanded += 1
+
+            # Thử từng bước di chuyển có thể
+            for move, delta in board.moves.items():
+                stats.phase = MOVEGEN
+                new_pos = player_pos + delta
+                new_box_pos = new_pos + delta
+
+                # Trường hợp 1: Di chuyển vào không gian trống - không đẩy thùng
+                if not occupancy >> new_pos & 1 and not self.is_wall(new_pos):
+                    new_hash = board.walk_hash(state_hash, player_pos, new_pos)
+                    stats.generated += 1
+                    stats.phase = BOOKKEEPING
+
+                    if not visited.contains(new_hash, new_pos, occupancy):
+                        # Thêm bước di chuyển vào tree
+                        stats.phase = HEURISTIC
+                        new_heuristic = self.calculate_heuristic(occupancy)
+                        stats.phase = BOOKKEEPING
+                        new_state = (new_heuristic, steps + 1, new_pos, boxes, new_hash, tree.add(node, move.lower()))
+                        heapq.heappush(priority_queue, new_state)
+                        self.nodes_generated += 1
+                    else:
+                        stats.duplicates += 1
+
+                # Trường hợp 2: Di chuyển và đẩy thùng
+                elif occupancy >> new_pos & 1 and not self.is_wall(new_box_pos) and not occupancy >> new_box_pos & 1:
+                    # Kiểm tra xem vị trí mới có phải là điểm chết hay không, hoặc có phải là mục tiêu
+                    if not self.deadlock_positions[new_box_pos]:
+                        # Cập nhật vị trí của thùng theo nhóm trọng lượng của nó
+                        group = board.group_at(boxes, new_pos)
+                        new_boxes = board.push(boxes, group, new_pos, new_box_pos)
+                        new_occupancy = board.occupancy(new_boxes)
+                        if is_freeze_deadlock(board, new_occupancy, new_box_pos):
+                            stats.pruned[FREEZE] += 1
+                            continue
+
+                        new_hash = board.push_hash(state_hash, player_pos, 0, new_pos, new_box_pos)
+                        stats.generated += 1
+                        stats.phase = BOOKKEEPING
+
+                        if not visited.contains(new_hash, new_pos, new_occupancy):
+                            # Tính toán heuristic mới, thêm bước đẩy vào tree
+                            stats.phase = HEURISTIC
+                            new_heuristic = self.calculate_heuristic(new_occupancy)
+                            stats.phase = BOOKKEEPING
+                            new_state = (new_heuristic, steps + 1, new_pos, new_boxes, new_hash, tree.add(node, move))
+                            heapq.heappush(priority_queue, new_state)
+                            self.nodes_generated += 1
+                        else:
+                            stats.duplicates += 1
+                    else:
+                        stats.pruned[DEAD_SQUARE] += 1
+            if len(priority_queue) > stats.frontier_peak:
+                stats.frontier_peak = len(priority_queue)
+        return None, 0
+
+    def runner(self):
+        try:
+            result, total_weight = self.gbfs()
+            if result:
+                # result đã là chuỗi các bước: đẩy thùng chữ hoa, di chuyển thường chữ thường
+                return self.nodes_generated, total_weight, result
+            else:
+                return None, 0, "NoSol"
+        except SearchStopped:
+            raise
+        except Exception as e:
+            print(f"Error in GBFS runner: {e}")
+            import traceback
+            traceback.print_exc()
+            return None, 0, "NoSol"
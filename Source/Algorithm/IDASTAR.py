@@ -0,0 +1,150 @@
+from .deadlock import is_freeze_deadlock
+from .heuristic import UNREACHABLE, AssignmentHeuristic, push_distance_table
+from .budget import CHECK_EVERY
+from .state import Board
+from .stats import BOOKKEEPING, BOUND, DEAD_SQUARE, FREEZE, HEURISTIC, MOVEGEN, NO_GOAL, SearchStats
+from .transposition import REPLACE_ALWAYS, TT_SIZE, TranspositionTable
+
+
+class IDASTAR:
+    def __init__(self, grid, player_pos, boxes, goals, weightOfBox, table_size=TT_SIZE, policy=REPLACE_ALWAYS):
+        """
+        IDA*: cùng mô hình cost (mỗi bước 1, mỗi lần đẩy cộng trọng lượng hộp) và heuristic với ASTAR,
+        nhưng tìm sâu dần theo f nên bộ nhớ chỉ gồm đường đi hiện tại và một bảng transposition
+        kích thước cố định (table_size ô, policy: "always" hoặc "depth").
+        """
+        self.grid = grid
+        self.board = Board(grid, player_pos, boxes, goals, weightOfBox)
+        self.player_pos = self.board.start_player
+        self.boxes = self.board.start_boxes
+        self.goals = set(goals)
+        self.pushDistance = push_distance_table(self.board)
+        self.heuristic = AssignmentHeuristic(self.board, self.pushDistance)
+        self.table = TranspositionTable(table_size, policy)
+        self.countNode = 0
+        self.iterations = 0
+        self.stats = SearchStats()
+        self.budget = None  # Budget: giới hạn thời gian / node / bộ nhớ, huỷ khi chạy nền
+
+    def MinimumCostFromBoxToGoal(self, boxes, parent=None, src=None, dst=None):
+        return self.heuristic.bound(boxes, parent, src, dst)
+
+    def details(self):
+        """Iterations and transposition table counters, on top of the shared ``self.stats``."""
+        table = self.table
+        return {
+            "iterations": self.iterations,
+            "table_size": table.size,
+            "table_policy": table.policy,
+            "table_hits": table.hits,
+            "table_stores": table.stores,
+            "table_replaced": table.replaced,
+            "table_rejected": table.rejected,
+        }
+
+    def winning(self, boxes):
+        return self.board.is_solved(boxes)
+
+    def children(self, h, player_pos, boxes, g, h_cost):
+        """
+        Các node con (f, -g, player, move, hash, boxes, h), xếp giảm dần để pop() lấy f nhỏ nhất trước.
+        Đi bộ giữ nguyên h của cha; đẩy hộp thì cập nhật phép gán từ cha.
+        """
+        board = self.board
+        stats = self.stats
+        walls = board.walls
+        dead = board.dead
+        stats.expanded += 1
+        stats.phase = MOVEGEN
+        occupancy = board.occupancy(boxes)
+        out = []
+        for move, delta in board.moves.items():
+            newPlayer_pos = player_pos + delta
+            if walls[newPlayer_pos]:
+                continue
+            if not occupancy >> newPlayer_pos & 1:
+                new_hash = board.walk_hash(h, player_pos, newPlayer_pos)
+                out.append((g + 1 + h_cost, -(g + 1), newPlayer_pos, move.lower(), new_hash, boxes, h_cost))
+                continue
+            newBox_pos = newPlayer_pos + delta
+            if walls[newBox_pos] or occupancy >> newBox_pos & 1:
+                continue
+            if dead[newBox_pos]:
+                stats.pruned[DEAD_SQUARE] += 1
+                continue
+            if is_freeze_deadlock(board, occupancy ^ (1 << newPlayer_pos) ^ (1 << newBox_pos), newBox_pos):
+                stats.pruned[FREEZE] += 1
+                continue
+            group = board.group_at(boxes, newPlayer_pos)
+            new_g = g + board.group_weights[group]
+            new_boxes = board.push(boxes, group, newPlayer_pos, newBox_pos)
+            stats.phase = HEURISTIC
+            new_h = self.MinimumCostFromBoxToGoal(new_boxes, boxes, newPlayer_pos, newBox_pos)
+            stats.phase = MOVEGEN
+            if new_h >= UNREACHABLE:
+                stats.pruned[NO_GOAL] += 1
+                continue
+            new_hash = board.push_hash(h, player_pos, group, newPlayer_pos, newBox_pos)
+            out.append((new_g + new_h, -new_g, newPlayer_pos, move, new_hash, new_boxes, new_h))
+        stats.generated += len(out)
+        stats.phase = BOOKKEEPING
+        out.sort(reverse=True)
+        return out
+
+    def search(self, threshold):
+        """
+        Một vòng tìm sâu với ngưỡng f <= threshold, dùng stack tường minh (không đệ quy).
+        Trả về (path, cost) nếu tìm thấy lời giải, ngược lại (None, f nhỏ nhất vượt ngưỡng).
+        """
+        board = self.board
+        stats = self.stats
+        table = self.table
+        table.new_iteration()
+        player_pos, boxes = self.player_pos, self.boxes
+        h = board.hash(player_pos, boxes)
+        table.visit(h, board.key(player_pos, boxes), 0)
+        next_threshold = None
+        stack = [self.children(h, player_pos, boxes, 0, self.MinimumCostFromBoxToGoal(boxes))]
+        path = []
+        stats.track(visited=table, frontier=stack, parents=path)
+        while stack:
+            frame = stack[-1]
+            if not frame:
+                stack.pop()
+                if path:
+                    path.pop()
+                continue
+            f, neg_g, player_pos, move, h, boxes, h_cost = frame.pop()
+            if f > threshold:
+                # Các node còn lại trong frame đều có f lớn hơn
+                if next_threshold is None or f < next_threshold:
+                    next_threshold = f
+                stats.pruned[BOUND] += len(frame) + 1
+                frame.clear()
+                continue
+            g = -neg_g
+            if table.visit(h, board.key(player_pos, boxes), g):
+                stats.duplicates += 1
+                continue
+            self.countNode += 1
+            if self.budget is not None and not self.countNode % CHECK_EVERY:
+                self.budget.update(self.countNode, len(path))
+            path.append(move)
+            if self.winning(boxes):
+                return "".join(path), g
+            stack.append(self.children(h, player_pos, boxes, g, h_cost))
+            if len(stack) > stats.frontier_peak:
+                stats.frontier_peak = len(stack)
+        return None, next_threshold
+
+    def runner(self):
+        if self.winning(self.boxes):
+            return self.countNode, 0, ""
+        threshold = self.MinimumCostFromBoxToGoal(self.boxes)
+        while threshold is not None and threshold < UNREACHABLE:
+            self.iterations += 1
+            solution, result = self.search(threshold)
+            if solution is not None:
+                return self.countNode, result, solution
+            threshold = result
+        return self.countNode, 0, "NoSol"
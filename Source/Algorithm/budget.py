@@ -0,0 +1,143 @@
+"""
+Resource budgets, cancellation and progress shared by the solvers.
+
+Every solver has a ``budget`` attribute (None means unlimited). Its search
+loop calls ``budget.update(nodes, frontier)`` once every ``CHECK_EVERY``
+expansions, so the hot path only pays an attribute test. ``update`` records
+progress for whoever is watching (e.g. the GUI thread) and raises a
+``SearchStopped`` subclass once a limit is passed or ``cancel()`` was called.
+
+``run(solver, budget)`` wraps ``runner()`` so every outcome, stopped or not,
+comes back as one ``SearchResult``. It also starts and stops the solver's
+``SearchStats`` (see stats.py) around the search.
+"""
+from collections import namedtuple
+import os
+import sys
+import time
+
+CHECK_EVERY = 1024
+
+try:
+    PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    PAGE_SIZE = 4096
+
+SOLVED = "solved"
+NO_SOLUTION = "no_solution"
+TIMEOUT = "timeout"
+NODE_LIMIT = "node_limit"
+OUT_OF_MEMORY = "out_of_memory"
+CANCELLED = "cancelled"
+
+SearchResult = namedtuple("SearchResult", "status nodes cost solution")
+
+
+class SearchStopped(Exception):
+    """Raised out of ``runner()`` when the budget stops the search."""
+    status = None
+
+
+class TimedOut(SearchStopped):
+    status = TIMEOUT
+
+
+class NodeLimitReached(SearchStopped):
+    status = NODE_LIMIT
+
+
+class OutOfMemory(SearchStopped):
+    status = OUT_OF_MEMORY
+
+
+class Cancelled(SearchStopped):
+    status = CANCELLED
+
+
+def rss_bytes():
+    """
+    Resident set size of this process, or None where it cannot be read
+    cheaply. Falls back to the peak RSS when the current one is unavailable.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, in KiB elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Budget:
+    """
+    Limits for one search: wall time (seconds), node count and memory
+    (bytes the process may grow by from ``start()``, measured as RSS, so it
+    is approximate and ignored where RSS cannot be read). Any limit left at
+    None is not checked.
+    """
+
+    def __init__(self, time_limit=None, max_nodes=None, max_memory=None):
+        self.time_limit = time_limit
+        self.max_nodes = max_nodes
+        self.max_memory = max_memory
+        self.cancelled = False
+        self.start()
+
+    def start(self):
+        self.nodes = 0
+        self.frontier = 0
+        self.start_time = time.perf_counter()
+        self.base_memory = rss_bytes() if self.max_memory is not None else None
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    def update(self, nodes, frontier):
+        self.nodes = nodes
+        self.frontier = frontier
+        if self.cancelled:
+            raise Cancelled
+        if self.time_limit is not None and self.elapsed >= self.time_limit:
+            raise TimedOut
+        if self.max_nodes is not None and nodes >= self.max_nodes:
+            raise NodeLimitReached
+        if self.base_memory is not None:
+            used = rss_bytes() - self.base_memory
+            if used >= self.max_memory:
+                raise OutOfMemory
+
+    def cancel(self):
+        self.cancelled = True
+
+
+def run(solver, budget=None):
+    """
+    ``solver.runner()`` under ``budget`` (or the solver's own default budget
+    when None), as a ``SearchResult``. ``cost`` and ``solution`` are None
+    unless the status is SOLVED.
+    """
+    if budget is not None:
+        solver.budget = budget
+    if solver.budget is not None:
+        solver.budget.start()
+    stats = getattr(solver, "stats", None)
+    if stats is not None:
+        stats.start()
+    try:
+        nodes, cost, solution = solver.runner()
+    except SearchStopped as stop:
+        return SearchResult(stop.status, solver.budget.nodes, None, None)
+    except MemoryError:
+        return SearchResult(OUT_OF_MEMORY, solver.budget.nodes if solver.budget else None, None, None)
+    finally:
+        if stats is not None:
+            stats.stop()
+    if solution in ("NoSol", None):
+        return SearchResult(NO_SOLUTION, nodes, None, None)
+    return SearchResult(SOLVED, nodes, cost, solution)
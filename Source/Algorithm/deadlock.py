@@ -0,0 +1,78 @@
+"""
+Deadlock tables shared by the solvers.
+
+Everything here is computed once per level from the walls and goals only,
+so the search loops can reject a push with a single array lookup.
+"""
+from collections import deque
+
+
+def dead_squares(board):
+    """
+    Mark every cell a box can never leave for a goal.
+
+    Start a box on each goal and pull it backwards: a box at ``c`` can be
+    pulled to ``c + d`` when the player has room to stand on ``c + d`` and
+    step back to ``c + 2d``. Any floor cell no pull reaches is dead.
+    Returns a bytearray indexed by cell, 1 = dead.
+    """
+    walls = board.walls
+    live = bytearray(board.size)
+    queue = deque()
+    for g in board.goals:
+        live[g] = 1
+        queue.append(g)
+
+    deltas = tuple(board.moves.values())
+    while queue:
+        c = queue.popleft()
+        for d in deltas:
+            nxt = c + d
+            if live[nxt] or walls[nxt] or walls[nxt + d]:
+                continue
+            live[nxt] = 1
+            queue.append(nxt)
+
+    return bytearray(0 if walls[c] or live[c] else 1 for c in range(board.size))
+
+
+def is_freeze_deadlock(board, occupancy, cell):
+    """
+    True when the box just pushed onto ``cell`` is frozen together with some
+    box that is not on a goal.
+
+    A box is frozen when it cannot move along either axis. An axis is blocked
+    by a wall on either side, by dead squares on both sides, or by a
+    neighbouring box that is frozen itself. Boxes still under examination
+    (and boxes already found frozen) count as walls, which ends the recursion
+    on cycles. Only the pushed box and the cluster of boxes touching it are
+    examined, never the whole set. ``occupancy`` must already include the
+    pushed box.
+    """
+    walls = board.walls
+    dead = board.dead
+    seen = set()
+    cluster = []
+
+    def blocked(c, d):
+        a, b = c - d, c + d
+        if walls[a] or walls[b] or a in seen or b in seen:
+            return True
+        if dead[a] and dead[b]:
+            return True
+        if occupancy >> a & 1 and frozen(a):
+            return True
+        return bool(occupancy >> b & 1 and frozen(b))
+
+    def frozen(c):
+        seen.add(c)
+        if blocked(c, 1) and blocked(c, board.ncols):
+            cluster.append(c)
+            return True
+        seen.discard(c)
+        return False
+
+    if not frozen(cell):
+        return False
+    goal_mask = board.goal_mask
+    return any(not goal_mask >> c & 1 for c in cluster)
@@ -0,0 +1,41 @@
+"""
+Best-first frontier shared by the informed solvers.
+"""
+import heapq
+
+
+class Frontier:
+    """
+    Binary heap of state ids, ordered by ``f``.
+
+    Entries are ``(f, -g, id)``, all plain ints. Equal ``f`` goes to the
+    deeper node first (higher g, so lower h), then to the older id, so
+    ordering never compares anything but ints. ``g`` is the solver's own
+    list of best known cost per state id. A state whose cost improves is
+    simply pushed again, and the old entry is dropped when it reaches the
+    top (lazy deletion). No lock is taken, unlike ``queue.PriorityQueue``.
+    """
+
+    def __init__(self, g):
+        self.g = g
+        self.heap = []
+        self.peak = 0
+
+    def __len__(self):
+        self.prune()
+        return len(self.heap)
+
+    def prune(self):
+        heap = self.heap
+        g = self.g
+        while heap and -heap[0][1] > g[heap[0][2]]:
+            heapq.heappop(heap)
+
+    def push(self, state_id, g, h):
+        heapq.heappush(self.heap, (g + h, -g, state_id))
+        if len(self.heap) > self.peak:
+            self.peak = len(self.heap)
+
+    def pop(self):
+        self.prune()
+        return heapq.heappop(self.heap)[2]
@@ -0,0 +1,167 @@
+"""
+Heuristic tables shared by the informed solvers.
+
+Like the deadlock tables these depend only on walls and goals, so they are
+built once per level when a solver is constructed.
+"""
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+
+# Push distance of a cell no box can leave for that goal. It is large enough
+# to dominate any real bound but small enough that weight * UNREACHABLE
+# cannot overflow int64.
+UNREACHABLE = 1 << 20
+
+
+def push_distance_table(board):
+    """
+    ``table[c, j]`` = least number of pushes that bring a box from cell ``c``
+    to goal ``j`` with no other box in the way.
+
+    Like ``dead_squares`` this pulls a box backwards from each goal: a box at
+    ``c`` can be pulled to ``c + d`` when the player has room on ``c + d`` and
+    ``c + 2d``. Unlike Manhattan distance it never goes through walls, so it
+    is a tighter lower bound. Pushing a box of weight ``w`` costs ``w`` per
+    push, so ``w * table[c, j]`` never overestimates.
+    """
+    walls = board.walls
+    deltas = tuple(board.moves.values())
+    table = np.full((board.size, len(board.goals)), UNREACHABLE, dtype=np.int64)
+    for j, g in enumerate(board.goals):
+        dist = table[:, j]
+        dist[g] = 0
+        queue = deque([g])
+        while queue:
+            c = queue.popleft()
+            for d in deltas:
+                nxt = c + d
+                if dist[nxt] != UNREACHABLE or walls[nxt] or walls[nxt + d]:
+                    continue
+                dist[nxt] = dist[c] + 1
+                queue.append(nxt)
+    return table
+
+
+HEURISTIC_CACHE_SIZE = 1 << 16
+INF = 1 << 62
+
+
+class AssignmentHeuristic:
+    """
+    Weighted box-to-goal assignment over ``push_distance_table``, memoized.
+
+    Bounds are kept in an LRU keyed on the ``boxes`` bitboard, so walk moves
+    (which leave the boxes alone) always hit. Each entry also keeps the
+    Hungarian potentials of its assignment. When a push child misses, the
+    parent's entry is copied, the moved box's row is unassigned and
+    re-augmented along one shortest path, O(boxes * goals) instead of a full
+    solve. The bound returned is the dual objective ``sum(u) + sum(v)``: it
+    equals the optimal assignment cost and never overestimates it.
+    """
+
+    def __init__(self, board, table, capacity=HEURISTIC_CACHE_SIZE):
+        self.board = board
+        self.rows = table.tolist()
+        self.ncols = len(board.goals)
+        self.capacity = capacity
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.incremental = 0
+        self.time = 0.0
+
+    def bound(self, boxes, parent=None, src=None, dst=None):
+        """
+        Bound for ``boxes``. ``parent``, ``src``, ``dst`` describe the push
+        that produced it, if any, and enable the incremental update.
+        """
+        start = time.perf_counter()
+        cache = self.cache
+        entry = cache.get(boxes)
+        if entry is not None:
+            self.hits += 1
+            cache.move_to_end(boxes)
+        else:
+            self.misses += 1
+            base = cache.get(parent) if parent is not None else None
+            if base is not None:
+                self.incremental += 1
+                entry = self.reassign(base, src, dst)
+            else:
+                entry = self.solve(boxes)
+            cache[boxes] = entry
+            if len(cache) > self.capacity:
+                cache.popitem(last=False)
+        self.time += time.perf_counter() - start
+        return entry[0]
+
+    def solve(self, boxes):
+        cells = []
+        weights = []
+        cost = [None]
+        for cell, w in self.board.box_list(boxes):
+            cells.append(cell)
+            weights.append(w)
+            cost.append([w * d for d in self.rows[cell]])
+        u = [0] * len(cost)
+        v = [0] * (self.ncols + 1)
+        match = [0] * (self.ncols + 1)
+        for i in range(1, len(cost)):
+            self.augment(cost, u, v, match, i)
+        return sum(u) + sum(v), cells, weights, cost, u, v, match
+
+    def reassign(self, base, src, dst):
+        _, cells, weights, cost, u, v, match = base
+        cells, cost, u, v, match = list(cells), list(cost), list(u), list(v), list(match)
+        i = cells.index(src) + 1
+        cells[i - 1] = dst
+        cost[i] = [weights[i - 1] * d for d in self.rows[dst]]
+        match[match.index(i)] = 0
+        self.augment(cost, u, v, match, i)
+        return sum(u) + sum(v), cells, weights, cost, u, v, match
+
+    def augment(self, cost, u, v, match, i):
+        """
+        Assign row ``i`` by one shortest augmenting path (Hungarian method).
+        ``match[j]`` is the row on column ``j``, 0 when free; index 0 of
+        ``u``, ``v`` and ``match`` is scratch space.
+        """
+        m = self.ncols
+        minv = [INF] * (m + 1)
+        used = [False] * (m + 1)
+        way = [0] * (m + 1)
+        match[0] = i
+        j0 = 0
+        while True:
+            used[j0] = True
+            i0 = match[j0]
+            row = cost[i0]
+            ui = u[i0]
+            delta = INF
+            j1 = 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    cur = row[j - 1] - ui - v[j]
+                    if cur < minv[j]:
+                        minv[j] = cur
+                        way[j] = j0
+                    if minv[j] < delta:
+                        delta = minv[j]
+                        j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[match[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if not match[j0]:
+                break
+        while j0:
+            j1 = way[j0]
+            match[j0] = match[j1]
+            j0 = j1
+        match[0] = 0
+        v[0] = 0
@@ -0,0 +1,155 @@
+"""
+Memory measurement around one search.
+
+A ``MemoryMeter`` is started before the search and stopped after it. Its
+mode picks what ``peak`` means:
+
+- ``rss`` (default): peak resident set size of the process above what it
+  held at ``start()``. Nothing hooks the allocator, so solvers run at full
+  speed. On Linux the kernel's peak counter (VmHWM) is reset at the start
+  and read at the end, so no spike is missed; elsewhere a thread samples
+  the RSS every ``SAMPLE_EVERY`` seconds. Memory the process kept from an
+  earlier search is reused without growing the RSS, so the figure is only
+  meaningful in a fresh process: solve.py runs each search in a child
+  process for it (``run_isolated``), as the portfolio workers already are.
+- ``tracemalloc``: exact peak of Python allocations. Every allocation is
+  traced, which makes allocation-heavy solvers several times slower, so it
+  is the opt-in detailed mode. It also sizes the structures the solver
+  registered with ``SearchStats.track`` (visited, frontier, parents) as
+  they stand when the search stops.
+- ``off``: nothing is measured.
+"""
+import gc
+import sys
+import threading
+import tracemalloc
+import types
+
+from .budget import rss_bytes
+from .state import Board
+
+RSS = "rss"
+TRACEMALLOC = "tracemalloc"
+OFF = "off"
+MEMORY_MODES = (RSS, TRACEMALLOC, OFF)
+
+# Sampling period (s) of the RSS where the kernel peak cannot be reset
+SAMPLE_EVERY = 0.005
+
+# Shared with the rest of the program, never counted as part of a structure
+SHARED = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType, Board)
+
+
+def peak_rss_bytes():
+    """Peak RSS since the process started or the last ``reset_peak_rss()``, None where unknown."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def reset_peak_rss():
+    """Reset the kernel's peak RSS to the current RSS. False where that is not supported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    return peak_rss_bytes() is not None
+
+
+def deep_size(obj, seen):
+    """Bytes of ``obj`` and of everything it references, skipping ids in ``seen`` (updated)."""
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, SHARED):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        stack.extend(gc.get_referents(obj))
+    return size
+
+
+def structure_sizes(structures):
+    """Bytes per named structure. An object reachable from several is counted in the first."""
+    seen = set()
+    return {name: deep_size(obj, seen) for name, obj in structures.items()}
+
+
+class MemoryMeter:
+    """
+    ``start()``, run the search, ``stop()``. Then ``peak`` holds the peak in
+    bytes (None with ``off`` or where the RSS cannot be read) and, in the
+    tracemalloc mode, ``structures`` the bytes of each tracked structure.
+    """
+
+    def __init__(self, mode=RSS):
+        if mode not in MEMORY_MODES:
+            raise ValueError(f"unknown memory mode {mode!r}")
+        self.mode = mode
+        self.peak = None
+        self.structures = None
+        self.base = None
+        self.sampler = None
+
+    def watch(self, stats):
+        """In the tracemalloc mode, size the structures ``stats`` tracks when the search stops."""
+        if self.mode == TRACEMALLOC:
+            stats.sizer = self.size
+
+    def start(self):
+        self.peak = None
+        self.structures = None
+        if self.mode == TRACEMALLOC:
+            tracemalloc.start()
+        elif self.mode == RSS:
+            self.base = rss_bytes()
+            if self.base is not None and not reset_peak_rss():
+                self.sampler = RssSampler(SAMPLE_EVERY)
+                self.sampler.start()
+
+    def size(self, structures):
+        if tracemalloc.is_tracing():
+            # Lấy peak trước khi đo: bảng seen của deep_size cũng là cấp phát
+            self.peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.structures = structure_sizes(structures)
+
+    def stop(self):
+        if self.mode == TRACEMALLOC:
+            if tracemalloc.is_tracing():
+                self.peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        elif self.mode == RSS and self.base is not None:
+            if self.sampler is not None:
+                self.sampler.stop()
+                peak = self.sampler.peak
+                self.sampler = None
+            else:
+                peak = peak_rss_bytes()
+            self.peak = max(0, max(peak, rss_bytes()) - self.base)
+        return self.peak
+
+
+class RssSampler(threading.Thread):
+    """Largest ``rss_bytes()`` seen every ``interval`` seconds until stopped."""
+
+    def __init__(self, interval):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = rss_bytes()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, rss_bytes())
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
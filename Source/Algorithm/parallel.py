@@ -0,0 +1,310 @@
+"""
+Layer-synchronous BFS across worker processes.
+
+``BFS.solve`` runs serially until it has generated ``PARALLEL_MIN_NODES``
+nodes, stops at the end of a layer and hands that layer and its visited
+table over here, so nothing it found is searched again. Each worker owns
+the states whose Zobrist hash is ``i`` modulo the number of workers: it
+gets their slice of the visited set and of the layer. From then on the
+workers send states to each other directly, over one pipe per ordered
+pair; the coordinator only starts each layer and adds up counts. Every
+state crosses a pipe as a fixed-size byte record, never as a pickled
+tuple. One layer is:
+
+1. expand: each worker expands its slice of the layer and sends every
+   child record to the child's owner;
+2. merge: each owner sorts what it received, drops the visited states and
+   keeps the rest as its slice of the next layer;
+3. rank: the owners swap their sorted order keys, so each one knows where
+   its states stand in the whole layer.
+
+A record carries an order key ``(parent position * 4 + move) * 2 + push``,
+the position being the parent's index in its layer in serial FIFO order
+(the handoff layer is numbered as the serial frontier held it). Sorting by
+that key reproduces the FIFO order, so keeping the first record of each
+state and the first goal in key order gives exactly the serial BFS
+solution. The workers keep every layer's keys and positions; the
+coordinator rebuilds the path by asking for one parent per layer back to
+the handoff layer and takes the rest from the serial parents table.
+
+The expanded / generated / duplicate counts are added to the serial ones;
+deadlock prunes happen in the workers and are not reported. When they
+stop, the workers send how much their RSS grew, summed into
+``solver.worker_memory`` (bytes).
+
+This is not a measured speedup yet: it has only run on a single core,
+where the workers take turns. Each child still crosses a pipe once and
+each key once per peer, which costs about as much as generating it.
+"""
+from array import array
+import multiprocessing
+import struct
+import threading
+
+import numpy as np
+
+from .budget import rss_bytes
+from .memory import peak_rss_bytes, reset_peak_rss
+
+RECORD = struct.Struct("<qQH")  # order key, Zobrist hash, player cell
+# How long (s) the coordinator waits for a stopping worker's memory report
+STOP_TIMEOUT = 1
+
+
+def box_bytes(board):
+    return (len(board.offsets) * board.size + 7) // 8
+
+
+def pack(key, h, player, boxes, nbytes):
+    return RECORD.pack(key, h, player) + boxes.to_bytes(nbytes, "little")
+
+
+class LayerWorker:
+    """One worker process: its visited slice, its slice of the current layer and the keys of past layers."""
+
+    def __init__(self, args, index, workers, visited, layer):
+        from .BFS import BFS
+        # Chỉ dùng lại move_state / is_deadlock của BFS để cắt tỉa y hệt bản tuần tự
+        self.solver = BFS(*args)
+        self.solver.budget = None
+        self.board = self.solver.board
+        self.index = index
+        self.workers = workers
+        self.nbytes = box_bytes(self.board)
+        self.size = RECORD.size + self.nbytes
+        self.visited = {self.board.key(player, boxes) for _, _, player, boxes in self.records(visited)}
+        self.layer = []
+        self.positions = []
+        for pos, h, player, boxes in self.records(layer):
+            self.layer.append((player, boxes, h))
+            self.positions.append(pos)
+        # history[d - 1] = (order keys, positions) của phần tầng d sau tầng bàn giao
+        self.history = []
+
+    def records(self, data):
+        size = self.size
+        for off in range(0, len(data), size):
+            key, h, player = RECORD.unpack_from(data, off)
+            yield key, h, player, int.from_bytes(data[off + RECORD.size:off + size], "little")
+
+    def expand(self):
+        board = self.board
+        move_state = self.solver.move_state
+        nbytes = self.nbytes
+        workers = self.workers
+        moves = list(board.moves.values())
+        out = [bytearray() for _ in range(workers)]
+        for pos, (player, boxes, h) in zip(self.positions, self.layer):
+            state = (player, boxes, 0, h)
+            occupancy = board.occupancy(boxes)
+            for m, delta in enumerate(moves):
+                new_state, is_pushing = move_state(state, occupancy, delta)
+                if new_state is None:
+                    continue
+                new_player, new_boxes, _, new_hash = new_state
+                out[new_hash % workers] += pack((pos * 4 + m) * 2 + is_pushing, new_hash, new_player,
+                                                new_boxes, nbytes)
+        return out
+
+    def merge(self, data):
+        board = self.board
+        records = sorted(self.records(data))
+        visited = self.visited
+        self.layer = []
+        keys = array("q")
+        goal = None
+        for key, h, player, boxes in records:
+            state_key = board.key(player, boxes)
+            if state_key in visited:
+                continue
+            visited.add(state_key)
+            if goal is None and board.is_solved(boxes):
+                goal = key
+            self.layer.append((player, boxes, h))
+            keys.append(key)
+        return keys, goal
+
+    def step(self, readers, writers):
+        """One layer. Returns (expanded, generated, new states, smallest goal key or None)."""
+        expanded = len(self.layer)
+        out = self.expand()
+        generated = sum(len(buf) for buf in out) // self.size
+        received = exchange(readers, writers, out)
+        received[self.index] = out[self.index]
+        keys, goal = self.merge(b"".join(received))
+        others = exchange(readers, writers, [keys.tobytes()] * self.workers)
+        # Vị trí trong cả tầng = vị trí trong phần của mình + số key nhỏ hơn ở các worker khác
+        keys = np.frombuffer(keys, dtype=np.int64)
+        positions = np.arange(len(keys), dtype=np.int64)
+        for data in others:
+            if data is not None:
+                positions += np.searchsorted(np.frombuffer(data, dtype=np.int64), keys)
+        self.history.append((keys, positions))
+        self.positions = positions.tolist()
+        return expanded, generated, len(keys), goal
+
+    def find(self, depth, pos):
+        """Order key of the state at ``pos`` in layer ``depth``, None if another worker owns it."""
+        keys, positions = self.history[depth - 1]
+        i = int(np.searchsorted(positions, pos))
+        if i < len(positions) and positions[i] == pos:
+            return int(keys[i])
+        return None
+
+
+def exchange(readers, writers, bufs):
+    """
+    Send ``bufs[j]`` to worker j and return what each worker sent here
+    (None at this worker's own index). The sends run on a thread: all
+    workers send at once, and a full pipe would block them all otherwise.
+    """
+    sender = threading.Thread(target=send_all, args=(writers, bufs))
+    sender.start()
+    received = [reader.recv_bytes() if reader is not None else None for reader in readers]
+    sender.join()
+    return received
+
+
+def send_all(writers, bufs):
+    for writer, buf in zip(writers, bufs):
+        if writer is not None:
+            writer.send_bytes(buf)
+
+
+def layer_worker(conn, args, index, workers, readers, writers):
+    base = rss_bytes()
+    kernel_peak = reset_peak_rss()
+    worker = LayerWorker(args, index, workers, conn.recv_bytes(), conn.recv_bytes())
+    while True:
+        command = conn.recv()
+        if command == "layer":
+            conn.send(worker.step(readers, writers))
+        elif command == "find":
+            conn.send(worker.find(*conn.recv()))
+        else:
+            break
+    peak = peak_rss_bytes() if kernel_peak else rss_bytes()
+    conn.send(max(0, peak - base) if base is not None and peak is not None else None)
+    conn.close()
+
+
+def parallel_bfs(solver, args, workers, frontier, parents):
+    """
+    Carry on the BFS of ``solver`` (a ``BFS``, built from the constructor
+    ``args``) with ``workers`` processes, from the layer ``frontier`` in
+    FIFO order and the visited table ``parents`` where the serial search
+    stopped. Returns ``(nodes, weight, path)`` like ``BFS.solve``.
+    """
+    board = solver.board
+    nbytes = box_bytes(board)
+    visited = [bytearray() for _ in range(workers)]
+    for h, player, boxes in parents.states():
+        visited[h % workers] += pack(0, h, player, boxes, nbytes)
+    layer = [bytearray() for _ in range(workers)]
+    for pos, (player, boxes, _, h) in enumerate(frontier):
+        layer[h % workers] += pack(pos, h, player, boxes, nbytes)
+    nodes = len(parents)
+    layer_size = len(frontier)
+    stats = solver.stats
+    stats.watch(frontier=lambda: layer_size, visited=lambda: nodes)
+
+    # spawn như portfolio trong solve.py: tiến trình GUI đang có thread SDL
+    context = multiprocessing.get_context("spawn")
+    # readers[j][i] / writers[i][j]: hai đầu ống worker i -> worker j
+    readers = [[None] * workers for _ in range(workers)]
+    writers = [[None] * workers for _ in range(workers)]
+    for i in range(workers):
+        for j in range(workers):
+            if i != j:
+                readers[j][i], writers[i][j] = context.Pipe(duplex=False)
+    conns = []
+    processes = []
+    # Worker đang chờ lệnh mới (không có dữ liệu dở trên pipe): mới đọc được báo cáo bộ nhớ khi dừng
+    idle = True
+    try:
+        for index in range(workers):
+            parent, child = context.Pipe()
+            process = context.Process(target=layer_worker, daemon=True,
+                                      args=(child, args, index, workers, readers[index], writers[index]))
+            process.start()
+            child.close()
+            conns.append(parent)
+            processes.append(process)
+        close_all(readers + writers)
+        for index, conn in enumerate(conns):
+            conn.send_bytes(visited[index])
+            conn.send_bytes(layer[index])
+        del visited, layer
+
+        depth = 0
+        while True:
+            idle = False
+            for conn in conns:
+                conn.send("layer")
+            replies = [conn.recv() for conn in conns]
+            idle = True
+            depth += 1
+
+            generated = sum(reply[1] for reply in replies)
+            layer_size = sum(reply[2] for reply in replies)
+            stats.expanded += sum(reply[0] for reply in replies)
+            stats.generated += generated
+            stats.duplicates += generated - layer_size
+            if not layer_size:
+                return nodes, 0, "NoSol"
+            nodes += layer_size
+            stats.frontier_peak = max(stats.frontier_peak, layer_size)
+            goals = [reply[3] for reply in replies if reply[3] is not None]
+            if goals:
+                idle = False
+                pos, moves = rebuild_path(board, conns, depth, min(goals))
+                idle = True
+                path = solver.reconstruct_path(parents, frontier[pos]) + moves
+                return nodes, board.push_weight(path), path
+            if solver.budget is not None:
+                solver.budget.update(nodes, layer_size)
+    finally:
+        close_all(readers + writers)
+        memory = 0
+        for conn in conns:
+            try:
+                conn.send("stop")
+                if idle and conn.poll(STOP_TIMEOUT):
+                    memory += conn.recv() or 0
+            except (OSError, EOFError):
+                pass
+            conn.close()
+        solver.worker_memory = memory
+        for process in processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+
+
+def close_all(ends):
+    for row in ends:
+        for end in row:
+            if end is not None:
+                end.close()
+
+
+def rebuild_path(board, conns, depth, key):
+    """
+    Moves from the handoff layer to the state with order ``key`` in layer
+    ``depth``, asking the workers for one parent per layer. Returns the
+    position in the handoff layer they start from, and the moves.
+    """
+    moves = list(board.moves)
+    path = []
+    while True:
+        move = moves[key >> 1 & 3]
+        path.append(move if key & 1 else move.lower())
+        pos = key >> 3
+        depth -= 1
+        if not depth:
+            path.reverse()
+            return pos, "".join(path)
+        for conn in conns:
+            conn.send("find")
+            conn.send((depth, pos))
+        key = next(found for found in [conn.recv() for conn in conns] if found is not None)
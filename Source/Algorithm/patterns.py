@@ -0,0 +1,235 @@
+"""
+Additive pattern databases over small box subsets.
+
+A pattern is a multiset of box weights, ``size`` boxes at most. Its table
+holds, for every placement of those boxes on live cells, the exact least
+weighted push cost that brings all of them onto goals when every other box
+is removed and the player may stand anywhere that is free. It is filled by
+a retrograde Dijkstra: start from every way of putting the boxes on goals
+and pull them backwards, a pull of a box of weight ``w`` costing ``w``.
+
+Pushes of different boxes are different pushes, so for any split of the
+boxes into disjoint patterns the sum of their table entries never
+overestimates the weighted push cost (walks only add to it). Boxes of the
+same weight are interchangeable: a placement is stored once, with its cells
+sorted inside each run of equal weights.
+
+All tables of a level are one int32 array, row ``p`` for pattern ``p``,
+indexed by the live-cell indices of its boxes. Tables depend only on walls,
+goals and weights, so they are saved under a hash of those and a repeat
+solve of the same level just loads the file.
+"""
+from itertools import combinations, permutations
+import hashlib
+import heapq
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from .heuristic import UNREACHABLE, AssignmentHeuristic
+
+PATTERN_VERSION = 1
+PATTERN_SIZE = 2
+PATTERN_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "patterns")
+# Table entry of a placement from which the boxes cannot all reach goals
+NO_PATTERN = np.iinfo(np.int32).max
+
+
+def canonical(weights, cells):
+    """Cells sorted inside each run of equal weights (``weights`` is sorted)."""
+    return tuple(c for _, c in sorted(zip(weights, cells)))
+
+
+class PatternDatabase:
+    def __init__(self, board, live, patterns, tables):
+        self.board = board
+        self.live = live
+        self.patterns = {weights: p for p, weights in enumerate(patterns)}
+        self.tables = tables
+        self.size = len(patterns[0]) if patterns else 0
+        self.index = [-1] * board.size
+        for i, c in enumerate(live):
+            self.index[c] = i
+        # Hệ số của từng ô trong chỉ số phẳng: i0 * n^(k-1) + ... + i(k-1)
+        n = len(live)
+        self.strides = [n ** (self.size - 1 - j) for j in range(self.size)]
+
+    @staticmethod
+    def live_cells(board):
+        return [c for c in range(board.size) if not board.walls[c] and not board.dead[c]]
+
+    @staticmethod
+    def pattern_weights(board, size):
+        """Every distinct sorted multiset of ``size`` weights among the boxes."""
+        return sorted({tuple(sorted(w)) for w in combinations(board.weights, size)})
+
+    @classmethod
+    def build(cls, board, size=PATTERN_SIZE):
+        live = cls.live_cells(board)
+        size = min(size, len(board.weights))
+        patterns = cls.pattern_weights(board, size) if size > 1 else []
+        tables = np.full((len(patterns), len(live) ** size), NO_PATTERN, dtype=np.int32)
+        database = cls(board, live, patterns, tables)
+        for p, weights in enumerate(patterns):
+            tables[p] = database.retrograde(weights)
+        return database
+
+    def flat(self, cells):
+        index = self.index
+        flat = 0
+        for c, stride in zip(cells, self.strides):
+            i = index[c]
+            if i < 0:
+                return -1
+            flat += i * stride
+        return flat
+
+    def retrograde(self, weights):
+        """Exact weighted cost of every placement of ``weights``, by pulling from the goals."""
+        board = self.board
+        walls = board.walls
+        deltas = tuple(board.moves.values())
+        dist = [NO_PATTERN] * len(self.live) ** len(weights)
+        heap = []
+        for cells in permutations(board.goals, len(weights)):
+            cells = canonical(weights, cells)
+            flat = self.flat(cells)
+            if flat >= 0 and dist[flat]:
+                dist[flat] = 0
+                heap.append((0, flat, cells))
+        heapq.heapify(heap)
+        while heap:
+            d, flat, cells = heapq.heappop(heap)
+            if d > dist[flat]:
+                continue
+            for i, c in enumerate(cells):
+                for delta in deltas:
+                    # Kéo hộp từ c về nc, Ares lùi từ nc sang stand: ngược với đẩy từ stand
+                    nc = c + delta
+                    stand = nc + delta
+                    if walls[nc] or walls[stand] or nc in cells or stand in cells:
+                        continue
+                    new_cells = canonical(weights, cells[:i] + (nc,) + cells[i + 1:])
+                    new_flat = self.flat(new_cells)
+                    nd = d + weights[i]
+                    if new_flat >= 0 and nd < dist[new_flat]:
+                        dist[new_flat] = nd
+                        heapq.heappush(heap, (nd, new_flat, new_cells))
+        return np.array(dist, dtype=np.int32)
+
+    def bound(self, cells, weights, singles):
+        """
+        Additive bound for boxes ``cells`` / ``weights``. ``singles[i]`` is the
+        one-box bound of box ``i``. Patterns are picked greedily by how much
+        they add over their boxes' singles, never sharing a box.
+        """
+        total = sum(singles)
+        size = self.size
+        if size < 2 or len(cells) < size:
+            return total
+        tables = self.tables
+        gains = []
+        for subset in combinations(range(len(cells)), size):
+            pairs = sorted((weights[i], cells[i]) for i in subset)
+            flat = self.flat([c for _, c in pairs])
+            if flat < 0:
+                continue
+            value = tables[self.patterns[tuple(w for w, _ in pairs)]].item(flat)
+            if value == NO_PATTERN:
+                # Nhóm hộp này không thể cùng về goal: state chết
+                return UNREACHABLE * sum(weights)
+            gain = value - sum(singles[i] for i in subset)
+            if gain > 0:
+                gains.append((gain, subset))
+        gains.sort(reverse=True)
+        used = set()
+        for gain, subset in gains:
+            if used.isdisjoint(subset):
+                used.update(subset)
+                total += gain
+        return total
+
+    @staticmethod
+    def key(board, size):
+        payload = json.dumps([
+            PATTERN_VERSION,
+            size,
+            board.ncols,
+            bytes(board.walls).hex(),
+            list(board.goals),
+            sorted(board.weights),
+        ])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        patterns = np.array(sorted(self.patterns, key=self.patterns.get), dtype=np.int64).reshape(len(self.patterns), self.size)
+        # Ghi ra file tạm rồi đổi tên: tiến trình khác không bao giờ đọc phải file dở
+        fd, tmp = tempfile.mkstemp(dir=directory or None, suffix=".npz")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, live=np.array(self.live, dtype=np.int32), patterns=patterns, tables=self.tables)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, board, path):
+        with np.load(path) as data:
+            patterns = [tuple(row) for row in data["patterns"].tolist()]
+            return cls(board, data["live"].tolist(), patterns, data["tables"])
+
+    @classmethod
+    def load_or_build(cls, board, size=PATTERN_SIZE, directory=PATTERN_DIR):
+        """The level's database from ``directory``, built and saved there on a miss."""
+        size = min(size, len(board.weights))
+        path = os.path.join(directory, cls.key(board, size) + ".npz") if directory else None
+        if path is not None and os.path.exists(path):
+            try:
+                return cls.load(board, path)
+            except (OSError, ValueError, KeyError):
+                pass
+        database = cls.build(board, size)
+        if path is not None:
+            try:
+                database.save(path)
+            except OSError:
+                pass
+        return database
+
+
+class PatternHeuristic(AssignmentHeuristic):
+    """
+    ``AssignmentHeuristic`` tightened by a ``PatternDatabase``: the bound is
+    the larger of the weighted assignment and the additive pattern bound,
+    both admissible. Memoization and incremental reassignment are unchanged.
+    """
+
+    def __init__(self, board, table, database):
+        super().__init__(board, table)
+        self.database = database
+        self.nearest = table.min(axis=1).tolist()
+
+    def tighten(self, entry):
+        _, cells, weights = entry[:3]
+        nearest = self.nearest
+        singles = [w * nearest[c] for c, w in zip(cells, weights)]
+        return (max(entry[0], self.database.bound(cells, weights, singles)),) + entry[1:]
+
+    def solve(self, boxes):
+        return self.tighten(super().solve(boxes))
+
+    def reassign(self, base, src, dst):
+        return self.tighten(super().reassign(base, src, dst))
+
+
+def pattern_heuristic(board, table, size=PATTERN_SIZE, directory=PATTERN_DIR):
+    """
+    ``PatternHeuristic`` for a solver's ``board`` and push distance ``table``.
+    With fewer than two boxes per pattern there is nothing to add to the
+    assignment bound, so the plain ``AssignmentHeuristic`` is returned.
+    """
+    if min(size, len(board.weights)) < 2:
+        return AssignmentHeuristic(board, table)
+    return PatternHeuristic(board, table, PatternDatabase.load_or_build(board, size, directory))
@@ -0,0 +1,250 @@
+"""
+Compact state encoding shared by every solver.
+
+The padded grid from ``check_and_pad_map`` gets one more ring of walls and is
+flattened, so a cell is a single int and a move is ``cell + delta``.
+A search state is then just two ints:
+
+* ``player``: index of the player's cell.
+* ``boxes``: box occupancy as a bitboard. Boxes are grouped by weight and
+  group ``g`` owns bits ``[g * size, (g + 1) * size)``, so boxes with the same
+  weight are interchangeable while a push still knows which weight it moves.
+
+``Board.key`` packs both into one int. The search tables key on a Zobrist
+hash instead (``Board.hash``), which a move updates in O(1), and ``StateTable``
+checks the stored state so a hash collision never merges two states.
+``SearchTree`` keeps the parent pointers the solvers rebuild their path from.
+"""
+import random
+from array import array
+
+from .deadlock import dead_squares
+
+ZOBRIST_SEED = 1012
+
+MOVE = {"U": (-1, 0), "D": (1, 0), "L": (0, -1), "R": (0, 1)}
+
+
+class Board:
+    def __init__(self, grid, player_pos, boxes, goals, weights):
+        self.nrows = len(grid) + 2
+        self.ncols = max(len(row) for row in grid) + 2
+        self.size = self.nrows * self.ncols
+        self.full = (1 << self.size) - 1
+        self.pbits = self.size.bit_length()
+
+        self.walls = bytearray(b"\x01") * self.size
+        for r, row in enumerate(grid):
+            for c, ch in enumerate(row):
+                if ch != "#":
+                    self.walls[self.cell((r, c))] = 0
+
+        # move char -> index delta, same order as MOVE
+        self.moves = {m: dr * self.ncols + dc for m, (dr, dc) in MOVE.items()}
+        self.goals = tuple(self.cell(g) for g in goals)
+        self.goal_mask = self.mask(self.goals)
+        # dead[c] == 1: a box pushed onto c can never reach a goal
+        self.dead = dead_squares(self)
+
+        # Side table: box i -> weight group. Boxes of equal weight share a group.
+        weights = list(weights) + [1] * (len(boxes) - len(weights))
+        self.weights = weights[:len(boxes)]
+        self.group_weights = sorted(set(self.weights))
+        group_of = {w: g for g, w in enumerate(self.group_weights)}
+        self.box_group = [group_of[w] for w in self.weights]
+        self.offsets = [g * self.size for g in range(len(self.group_weights))]
+
+        self.start_player = self.cell(player_pos)
+        self.start_boxes = 0
+        for pos, g in zip(boxes, self.box_group):
+            self.start_boxes |= 1 << (self.cell(pos) + self.offsets[g])
+
+        # Zobrist tables: one random word per player cell and per (group, cell).
+        # 61 bits keeps the hash a small int that Python hashes as itself.
+        rng = random.Random(ZOBRIST_SEED)
+        self.zobrist_player = [rng.getrandbits(61) for _ in range(self.size)]
+        self.zobrist_box = [[rng.getrandbits(61) for _ in range(self.size)]
+                            for _ in self.offsets]
+
+    def cell(self, pos):
+        return (pos[0] + 1) * self.ncols + pos[1] + 1
+
+    def position(self, cell):
+        r, c = divmod(cell, self.ncols)
+        return r - 1, c - 1
+
+    def mask(self, cells):
+        bits = 0
+        for c in cells:
+            bits |= 1 << c
+        return bits
+
+    @staticmethod
+    def cells(bits):
+        """Yield the index of every set bit, lowest first."""
+        while bits:
+            low = bits & -bits
+            yield low.bit_length() - 1
+            bits ^= low
+
+    def occupancy(self, boxes):
+        """Bitboard of every box regardless of its weight group."""
+        if len(self.offsets) == 1:
+            return boxes
+        occ = 0
+        full = self.full
+        for off in self.offsets:
+            occ |= (boxes >> off) & full
+        return occ
+
+    def group_at(self, boxes, cell):
+        for g, off in enumerate(self.offsets):
+            if boxes >> (cell + off) & 1:
+                return g
+        return None
+
+    def weight_at(self, boxes, cell):
+        return self.group_weights[self.group_at(boxes, cell)]
+
+    def push(self, boxes, group, src, dst):
+        """Move one box of ``group`` from ``src`` to ``dst``."""
+        return boxes ^ (((1 << src) | (1 << dst)) << self.offsets[group])
+
+    def box_list(self, boxes):
+        """``[(cell, weight), ...]`` for every box, grouped by weight."""
+        out = []
+        full = self.full
+        for g, off in enumerate(self.offsets):
+            w = self.group_weights[g]
+            for c in self.cells((boxes >> off) & full):
+                out.append((c, w))
+        return out
+
+    def key(self, player, boxes):
+        return (boxes << self.pbits) | player
+
+    def split_key(self, key):
+        return key & ((1 << self.pbits) - 1), key >> self.pbits
+
+    def hash(self, player, boxes):
+        h = self.zobrist_player[player]
+        full = self.full
+        for g, off in enumerate(self.offsets):
+            table = self.zobrist_box[g]
+            for c in self.cells((boxes >> off) & full):
+                h ^= table[c]
+        return h
+
+    def occupancy_hash(self, player, occupancy):
+        """Hash of (player, occupancy) for solvers that ignore box weights."""
+        h = self.zobrist_player[player]
+        table = self.zobrist_box[0]
+        for c in self.cells(occupancy):
+            h ^= table[c]
+        return h
+
+    def walk_hash(self, h, src, dst):
+        return h ^ self.zobrist_player[src] ^ self.zobrist_player[dst]
+
+    def push_hash(self, h, player, group, src, dst):
+        """Player steps from ``player`` to ``src`` pushing a box to ``dst``."""
+        table = self.zobrist_box[group]
+        return h ^ self.zobrist_player[player] ^ self.zobrist_player[src] ^ table[src] ^ table[dst]
+
+    def is_solved(self, boxes):
+        return not (self.occupancy(boxes) & ~self.goal_mask)
+
+    def push_weight(self, path):
+        """Total weight pushed along the LURD ``path`` from the start state."""
+        player, boxes = self.start_player, self.start_boxes
+        total = 0
+        for move in path:
+            delta = self.moves[move.upper()]
+            player += delta
+            if move.isupper():
+                group = self.group_at(boxes, player)
+                total += self.group_weights[group]
+                boxes = self.push(boxes, group, player, player + delta)
+        return total
+
+
+class StateTable:
+    """
+    Map from state to value keyed on the Zobrist hash.
+
+    Each slot keeps the (player, boxes) it was written for. A lookup whose
+    hash matches a different state falls back to ``overflow``, keyed on the
+    full ``Board.key``, so collisions cost a slower lookup but never a wrong
+    answer.
+    """
+
+    def __init__(self, board):
+        self.board = board
+        self.slots = {}
+        self.overflow = {}
+
+    def __len__(self):
+        return len(self.slots) + len(self.overflow)
+
+    def get(self, h, player, boxes, default=None):
+        slot = self.slots.get(h)
+        if slot is None:
+            return default
+        if slot[0] == player and slot[1] == boxes:
+            return slot[2]
+        if not self.overflow:
+            return default
+        return self.overflow.get(self.board.key(player, boxes), default)
+
+    def put(self, h, player, boxes, value):
+        slot = self.slots.get(h)
+        if slot is None or (slot[0] == player and slot[1] == boxes):
+            self.slots[h] = (player, boxes, value)
+        else:
+            self.overflow[self.board.key(player, boxes)] = value
+
+    def add(self, h, player, boxes):
+        self.put(h, player, boxes, True)
+
+    def contains(self, h, player, boxes):
+        return self.get(h, player, boxes) is not None
+
+    def states(self):
+        """Every stored state as ``(hash, player, boxes)``."""
+        for h, (player, boxes, _) in self.slots.items():
+            yield h, player, boxes
+        for key in self.overflow:
+            player, boxes = self.board.split_key(key)
+            yield self.board.hash(player, boxes), player, boxes
+
+
+class SearchTree:
+    """
+    Parent pointers for search nodes, array backed.
+
+    Node ids are handed out in order. ``parent`` is an ``array('i')`` (-1 for
+    the root) and ``move`` a bytearray of move letters, so a node costs five
+    bytes rather than a copy of its whole path. ``path`` rebuilds the LURD
+    string once, when the goal is found.
+    """
+
+    def __init__(self):
+        self.parent = array("i")
+        self.move = bytearray()
+
+    def __len__(self):
+        return len(self.move)
+
+    def add(self, parent, move):
+        self.parent.append(parent)
+        self.move.append(ord(move) if move else 0)
+        return len(self.move) - 1
+
+    def path(self, node):
+        moves = bytearray()
+        parent = self.parent
+        while parent[node] >= 0:
+            moves.append(self.move[node])
+            node = parent[node]
+        moves.reverse()
+        return moves.decode()
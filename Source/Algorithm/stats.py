@@ -0,0 +1,167 @@
+"""
+Search statistics shared by every solver.
+
+Each solver owns a ``SearchStats`` as ``self.stats`` and bumps its plain
+int fields inline, so counting costs one attribute increment. The counters
+mean the same thing in every solver, whatever it reports as its node count:
+
+- ``expanded``: states whose successors were generated;
+- ``generated``: successors that are legal and passed the deadlock checks,
+  duplicates included;
+- ``duplicates``: generated successors already known at no better cost
+  (or found in a transposition table), so nothing new was stored;
+- ``pruned``: successors dropped by reason: a dead square, a freeze
+  deadlock, no goal assignment left (``no_goal``), over the f bound
+  (IDA*) or over the depth limit (DFS);
+- ``frontier_peak``: most states waiting at once (open list, queue, or the
+  DFS / IDA* stack);
+- ``visited``: states in the visited table when the search ended.
+
+Time is split across movegen, heuristic and bookkeeping by sampling. The
+solver stores its current phase in ``stats.phase`` when it switches, and
+with ``sample_every`` set, a ``StatsSampler`` thread counts the phase it
+finds every ``sample_every`` seconds. The same ticks record counter
+snapshots (``samples``) for live charts. Without sampling only the
+counters and the wall time are filled in.
+
+Solvers also ``track`` their visited / frontier / parents structures, so
+the detailed memory mode (see memory.py) can size them before they go.
+"""
+import json
+import threading
+import time
+
+MOVEGEN = "movegen"
+HEURISTIC = "heuristic"
+BOOKKEEPING = "bookkeeping"
+PHASES = (MOVEGEN, HEURISTIC, BOOKKEEPING)
+
+DEAD_SQUARE = "dead_square"
+FREEZE = "freeze"
+NO_GOAL = "no_goal"
+BOUND = "bound"
+DEPTH = "depth"
+PRUNE_REASONS = (DEAD_SQUARE, FREEZE, NO_GOAL, BOUND, DEPTH)
+
+# Default sampling period (s) when sampling is asked for without one
+SAMPLE_EVERY = 0.01
+
+
+class SearchStats:
+    def __init__(self):
+        self.expanded = 0
+        self.generated = 0
+        self.duplicates = 0
+        self.pruned = dict.fromkeys(PRUNE_REASONS, 0)
+        self.frontier_peak = 0
+        self.visited = 0
+        self.phase = BOOKKEEPING
+        self.ticks = dict.fromkeys(PHASES, 0)
+        self.samples = []
+        self.sample_every = None
+        self.callback = None  # called with each sample, on the sampler thread
+        self.elapsed = 0.0
+        self.start_time = None
+        self.sampler = None
+        self.frontier_size = None
+        self.visited_size = None
+        self.structures = {}
+        self.sizer = None  # called with the tracked structures when the search stops
+
+    def watch(self, frontier=None, visited=None):
+        """
+        Callables giving the current frontier / visited size, read by the
+        samples and once more when the search stops.
+        """
+        if frontier is not None:
+            self.frontier_size = frontier
+        if visited is not None:
+            self.visited_size = visited
+
+    def track(self, **structures):
+        """The solver's data structures by role (visited, frontier, parents), kept until ``stop()``."""
+        self.structures.update(structures)
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        if self.sample_every:
+            self.sampler = StatsSampler(self, self.sample_every)
+            self.sampler.start()
+
+    def stop(self):
+        if self.sampler is not None:
+            self.sampler.stop()
+            self.sampler = None
+        if self.start_time is not None:
+            self.elapsed = time.perf_counter() - self.start_time
+        if self.visited_size is not None:
+            self.visited = self.visited_size()
+        if self.sizer is not None and self.structures:
+            self.sizer(self.structures)
+        # Không giữ lại bảng visited / frontier sau khi tìm xong
+        self.frontier_size = self.visited_size = None
+        self.structures = {}
+
+    def tick(self):
+        self.ticks[self.phase] += 1
+        sample = self.snapshot()
+        self.samples.append(sample)
+        if self.callback is not None:
+            self.callback(sample)
+
+    def snapshot(self):
+        """Counters now, for a live chart row."""
+        elapsed = time.perf_counter() - self.start_time if self.start_time is not None else 0.0
+        return {
+            "t": round(elapsed, 4),
+            "expanded": self.expanded,
+            "generated": self.generated,
+            "duplicates": self.duplicates,
+            "frontier": self.frontier_size() if self.frontier_size is not None else None,
+            "visited": self.visited_size() if self.visited_size is not None else self.visited,
+            "phase": self.phase,
+        }
+
+    def timings(self):
+        """Seconds per phase estimated from the sampled ticks, None without samples."""
+        total = sum(self.ticks.values())
+        if not total:
+            return None
+        return {phase: round(self.elapsed * count / total, 6) for phase, count in self.ticks.items()}
+
+    def as_dict(self, samples=False):
+        stats = {
+            "expanded": self.expanded,
+            "generated": self.generated,
+            "duplicates": self.duplicates,
+            "pruned": dict(self.pruned),
+            "frontier_peak": self.frontier_peak,
+            "visited": self.visited,
+            "elapsed": round(self.elapsed, 6),
+            "expanded_per_sec": round(self.expanded / self.elapsed, 1) if self.elapsed else None,
+            "timings": self.timings(),
+        }
+        if samples:
+            stats["samples"] = list(self.samples)
+        return stats
+
+    def to_json(self, samples=False, **kwargs):
+        return json.dumps(self.as_dict(samples), **kwargs)
+
+
+class StatsSampler(threading.Thread):
+    """Calls ``stats.tick()`` every ``interval`` seconds until stopped."""
+
+    def __init__(self, stats, interval):
+        super().__init__(daemon=True)
+        self.stats = stats
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.stats.tick()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
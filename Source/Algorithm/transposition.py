@@ -0,0 +1,69 @@
+"""
+Fixed-size transposition table for the depth-first solvers.
+"""
+from array import array
+
+TT_SIZE = 1 << 18
+REPLACE_ALWAYS = "always"
+REPLACE_DEPTH = "depth"
+POLICIES = (REPLACE_ALWAYS, REPLACE_DEPTH)
+
+
+class TranspositionTable:
+    """
+    ``size`` slots (a power of two) indexed by the low bits of the Zobrist
+    hash. A slot holds the exact state key, the lowest g it was reached with
+    and the iteration that stored it, so memory does not grow however long
+    the search runs. Entries from an earlier iteration count as empty.
+
+    When a different state hashes to an occupied slot ``policy`` decides
+    which one stays: ``"always"`` keeps the newcomer, ``"depth"`` keeps the
+    one nearer the root (lower g), which prunes the bigger subtree. Sokoban
+    transpositions are mostly local (walks around the same boxes), so
+    "always" usually prunes more once the table is full.
+    """
+
+    def __init__(self, size=TT_SIZE, policy=REPLACE_ALWAYS):
+        if size <= 0 or size & (size - 1):
+            raise ValueError(f"table size must be a power of two, got {size}")
+        if policy not in POLICIES:
+            raise ValueError(f"unknown replacement policy {policy!r}")
+        self.size = size
+        self.policy = policy
+        self.mask = size - 1
+        self.keys = [None] * size
+        self.g = array("q", bytes(8 * size))
+        self.iteration = array("I", bytes(4 * size))
+        self.current = 0
+        self.hits = 0
+        self.stores = 0
+        self.replaced = 0
+        self.rejected = 0
+
+    def new_iteration(self):
+        self.current += 1
+
+    def visit(self, h, key, g):
+        """
+        True if ``key`` was already reached this iteration with cost <= g, so
+        the caller can skip it. Otherwise records it (if the policy allows)
+        and returns False.
+        """
+        i = h & self.mask
+        fresh = self.iteration[i] == self.current
+        if fresh and self.keys[i] == key:
+            if self.g[i] <= g:
+                self.hits += 1
+                return True
+            self.g[i] = g
+            return False
+        if fresh:
+            if self.policy == REPLACE_DEPTH and self.g[i] < g:
+                self.rejected += 1
+                return False
+            self.replaced += 1
+        self.keys[i] = key
+        self.g[i] = g
+        self.iteration[i] = self.current
+        self.stores += 1
+        return False
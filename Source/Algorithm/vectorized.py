@@ -0,0 +1,159 @@
+"""
+Batched BFS backend: one whole layer is expanded with NumPy array ops.
+
+A layer is held as arrays: ``player`` (k,) and ``cells`` (k, n), the box
+cells grouped by weight group and sorted inside each group, so a state has
+exactly one row. Walls, boxes, push legality and dead squares are checked
+for all k x 4 moves at once; only the freeze-deadlock test (a recursive
+walk over neighbouring boxes) runs per push in Python, on the pushes that
+survive the cheap filters.
+
+Each state also packs into one int64 key (player and box cells, one
+``size.bit_length()`` field each), so the visited set is one sorted int64
+array, deduplication is ``np.unique`` and the visited lookup is
+``np.searchsorted``. Children are kept in (parent position, move) order,
+the order the serial BFS's FIFO generates them in, so the first goal, its
+path and the node count match ``BFS.solve`` exactly.
+"""
+import numpy as np
+
+from .deadlock import is_freeze_deadlock
+from .stats import BOOKKEEPING, DEAD_SQUARE, FREEZE, MOVEGEN
+
+
+def fits(board):
+    """True if a state packs into one int64 key; otherwise use the serial BFS."""
+    return (len(board.box_group) + 1) * board.size.bit_length() <= 63
+
+
+class BatchedBFS:
+    def __init__(self, solver):
+        board = solver.board
+        self.solver = solver
+        self.board = board
+        self.walls = np.frombuffer(bytes(board.walls), dtype=np.uint8).astype(bool)
+        self.dead = np.frombuffer(bytes(board.dead), dtype=np.uint8).astype(bool)
+        self.goal = np.zeros(board.size, dtype=bool)
+        self.goal[list(board.goals)] = True
+        self.deltas = np.array(list(board.moves.values()), dtype=np.int64)
+        self.letters = list(board.moves)
+        self.bits = board.size.bit_length()
+        # Các cột hộp theo nhóm trọng lượng: nhóm g chiếm cột [start, end)
+        counts = [board.box_group.count(g) for g in range(len(board.offsets))]
+        self.segments = []
+        start = 0
+        for count in counts:
+            self.segments.append((start, start + count))
+            start += count
+
+    def start_layer(self):
+        board = self.board
+        cells = []
+        for off in board.offsets:
+            cells.extend(board.cells((board.start_boxes >> off) & board.full))
+        return np.array([board.start_player], dtype=np.int64), np.array([cells], dtype=np.int64)
+
+    def keys(self, player, cells):
+        key = player.copy()
+        for j in range(cells.shape[1]):
+            key |= cells[:, j] << ((j + 1) * self.bits)
+        return key
+
+    def expand(self, player, cells, known):
+        """
+        Children of the layer (player, cells) not in ``known`` (sorted keys), first
+        occurrence only, in (parent, move) order: (player, cells, keys, parent, move code).
+        """
+        walls = self.walls
+        stats = self.solver.stats
+        stats.phase = MOVEGEN
+        target = player[:, None] + self.deltas[None, :]
+        hit = cells[:, :, None] == target[:, None, :]
+        has_box = hit.any(axis=1)
+        walk = ~walls[target] & ~has_box
+        dest = target + self.deltas[None, :]
+        push = has_box & ~walls[dest]
+        push &= ~(cells[:, :, None] == dest[:, None, :]).any(axis=1)
+        stats.pruned[DEAD_SQUARE] += int((push & self.dead[dest]).sum())
+        push &= ~self.dead[dest]
+
+        # Freeze deadlock chỉ kiểm tra từng lần đẩy còn lại, giống move_state
+        board = self.board
+        rows, moves = np.nonzero(push)
+        for i, m in zip(rows.tolist(), moves.tolist()):
+            occupancy = 0
+            for c in cells[i].tolist():
+                occupancy |= 1 << c
+            src = int(target[i, m])
+            dst = int(dest[i, m])
+            if is_freeze_deadlock(board, occupancy ^ (1 << src) ^ (1 << dst), dst):
+                stats.pruned[FREEZE] += 1
+                push[i, m] = False
+
+        flat = np.flatnonzero(walk | push)
+        parent = flat // 4
+        move = flat % 4
+        is_push = push[parent, move]
+        child_player = target[parent, move]
+        child_cells = cells[parent]
+        pushed = np.flatnonzero(is_push)
+        if len(pushed):
+            column = hit[parent[pushed], :, move[pushed]].argmax(axis=1)
+            child_cells[pushed, column] = dest[parent[pushed], move[pushed]]
+            for start, end in self.segments:
+                if end - start > 1:
+                    child_cells[pushed, start:end] = np.sort(child_cells[pushed, start:end], axis=1)
+
+        keys = self.keys(child_player, child_cells)
+        stats.phase = BOOKKEEPING
+        _, first = np.unique(keys, return_index=True)
+        first.sort()
+        # known đã sắp xếp: tra bằng searchsorted thay vì để np.isin sắp xếp lại mỗi tầng
+        found = np.searchsorted(known, keys[first])
+        found[found == len(known)] = 0
+        first = first[known[found] != keys[first]] if len(known) else first
+        stats.expanded += len(player)
+        stats.generated += len(flat)
+        stats.duplicates += len(flat) - len(first)
+        return (child_player[first], child_cells[first], keys[first],
+                parent[first], move[first] * 2 + is_push[first])
+
+    def solve(self):
+        solver = self.solver
+        player, cells = self.start_layer()
+        keys = self.keys(player, cells)
+        if self.goal[cells].all():
+            return 1, 0, ""
+        visited = np.sort(keys)
+        parents = []
+        codes = []
+        nodes = 1
+        while len(player):
+            player, cells, keys, parent, code = self.expand(player, cells, visited)
+            visited = np.concatenate((visited, keys))
+            visited.sort(kind="stable")
+            solver.stats.visited = len(visited)
+            solver.stats.frontier_peak = max(solver.stats.frontier_peak, len(player))
+            parents.append(parent)
+            codes.append(code)
+            nodes += len(player)
+            solved = np.flatnonzero(self.goal[cells].all(axis=1))
+            if len(solved):
+                goal = int(solved[0])
+                path = self.rebuild_path(parents, codes, goal)
+                # BFS tuần tự còn sinh con của các state đứng trước goal trong cùng tầng
+                ahead = self.expand(player[:goal], cells[:goal], visited)
+                nodes += len(ahead[0])
+                return nodes, self.board.push_weight(path), path
+            if solver.budget is not None:
+                solver.budget.update(nodes, len(player))
+        return nodes, 0, "NoSol"
+
+    def rebuild_path(self, parents, codes, pos):
+        path = []
+        for parent, code in zip(reversed(parents), reversed(codes)):
+            letter = self.letters[code[pos] >> 1]
+            path.append(letter if code[pos] & 1 else letter.lower())
+            pos = parent[pos]
+        path.reverse()
+        return "".join(path)
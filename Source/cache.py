@@ -0,0 +1,93 @@
+"""
+Persistent solution cache shared by the GUI (main.py) and the headless
+runner (solve.py).
+
+A record is stored under a hash of exactly what the solver is given (padded
+grid, box weights, player, boxes and goals) plus the algorithm name, so a
+level that did not change is never searched twice. The store is a small
+SQLite file. Once the stored records pass ``max_bytes`` the least recently
+used ones are evicted.
+"""
+from contextlib import closing
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from Algorithm.budget import NO_SOLUTION, SOLVED
+from world import check_and_pad_map
+
+# Bump when a solver change makes old records stale
+CACHE_VERSION = 1
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "solutions.sqlite3")
+CACHE_MAX_BYTES = 8 * 1024 ** 2
+# Only outcomes that do not depend on the budget are worth keeping
+CACHED_STATUSES = (SOLVED, NO_SOLUTION)
+
+
+def solution_key(world, algorithm_name):
+    payload = json.dumps([
+        CACHE_VERSION,
+        algorithm_name,
+        ["".join(row) for row in check_and_pad_map(world.grid)],
+        list(world.stone_weights),
+        list(world.player_pos[0]),
+        [list(pos) for pos in world.boxes],
+        [list(pos) for pos in world.goals],
+    ])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class SolutionCache:
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.connect() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS solutions ("
+                       "key TEXT PRIMARY KEY, record TEXT NOT NULL, "
+                       "size INTEGER NOT NULL, used REAL NOT NULL)")
+
+    def connect(self):
+        # One short-lived connection per call: the GUI and the pool workers never share one
+        return closing(sqlite3.connect(self.path, timeout=10))
+
+    def get(self, key):
+        """The stored record for ``key``, or None."""
+        with self.connect() as db, db:
+            row = db.execute("SELECT record FROM solutions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            db.execute("UPDATE solutions SET used = ? WHERE key = ?", (time.time(), key))
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, record):
+        """Store ``record`` if its status is worth caching, then evict down to ``max_bytes``."""
+        if record.get("status") not in CACHED_STATUSES:
+            return False
+        # An anytime solution that is not proven optimal would improve with more time
+        if record.get("bound", 1.0) > 1.0:
+            return False
+        data = json.dumps(record)
+        with self.connect() as db, db:
+            db.execute("INSERT OR REPLACE INTO solutions (key, record, size, used) VALUES (?, ?, ?, ?)",
+                       (key, data, len(data), time.time()))
+            total = 0
+            stale = []
+            for old_key, size in db.execute("SELECT key, size FROM solutions ORDER BY used DESC"):
+                total += size
+                if total > self.max_bytes:
+                    stale.append((old_key,))
+            db.executemany("DELETE FROM solutions WHERE key = ?", stale)
+        return True
+
+    def clear(self):
+        with self.connect() as db, db:
+            db.execute("DELETE FROM solutions")
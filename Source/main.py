@@ -1,82 +1,32 @@
-from collections import namedtuple
-from Algorithm import ASTAR, BFS, DFS, Dijkstra, UCS, GBFS
+from Algorithm.budget import Budget, SOLVED, run
+from Algorithm.memory import OFF, MemoryMeter
+from cache import SolutionCache, solution_key
+from solve import ALGORITHMS, make_solver, solve_portfolio
+from world import Tile, World
 from enum import Enum
 import sys
 import pygame
+import sqlite3
+import threading
 import time
-import tracemalloc
+import traceback
 
-Tile = namedtuple("Tile", "wall ares goal stone")
 Dir = Enum('Dir', 'UP DN LT RT')
 Key = Enum('Key', 'UP DOWN LEFT RIGHT QUIT SKIP')
 icon = pygame.image.load(r'./Images/icon.ico') 
 MOVE = {"U": (-1, 0), "D": (1, 0), "L": (0, -1), "R": (0, 1)}
 pygame.init()
 run_once = True
-
-class World:
-    def __init__(self, filename):
-        try:
-            with open(filename, "r") as f:
-                lines = f.readlines()
-            self.stone_weights = list(map(int, lines[0].split()))
-            self.grid = [list(line.rstrip("\n")) for line in lines[1:]]
-            self.player_pos = []
-            self.boxes = []
-            self.goals = []
-            self.wall_pos = []
-            self.nrows = 0
-            self.ncols = 0
-            for i, line in enumerate(lines[1:]):
-                row = line.rstrip()
-                for j, tile in enumerate(row):
-                    pos = (i, j)
-                    if tile in ('@', '+'):
-                        self.player_pos.append(pos)
-                    if tile in ('$', '*'):
-                        self.boxes.append(pos)
-                    if tile in ('.', '*', '+'):
-                        self.goals.append(pos)
-                    if tile == '#':
-                        self.wall_pos.append(pos)
-            
-            self.stone_weights_map = {}
-            self.stone_weights_map = {}
-            for i in range(len(self.boxes)):            
-                self.stone_weights_map[self.boxes[i]] = self.stone_weights[i]
-            # để debug đảm bảo input vào là đúng
-            '''for row in self.grid:
-                print(row)
-            print("Player Position:", self.player_pos)
-            print("Boxes:", self.boxes)
-            print("Goals:", self.goals)
-            print("Box Weights:", self.stone_weights)
-            print(self.stone_weights_map)'''
-        except (OSError, IOError):
-            print("sokoban: loading levels from text file failed!", file=sys.stderr)
-            exit(1)
-        self.load_size()
-
-    def load_size(self):
-        self.nrows = len(self.grid)
-        self.ncols = max(len(row) for row in self.grid) if self.grid else 0
-
-    def get(self, pos):
-        return Tile(wall = (pos in self.wall_pos),
-                    ares = (pos in self.player_pos),
-                    goal = (pos in self.goals),
-                    stone = (pos in self.boxes))
-
-    def push_stone(self, from_pos, to_pos):
-        if from_pos in self.boxes:
-            self.boxes.remove(from_pos)
-            self.boxes.append(to_pos)
-
-            self.stone_weights_map[to_pos] = self.stone_weights_map.pop(from_pos)
-
-    def move_ares(self, to_pos):
-        self.player_pos = [to_pos]
-
+# Sự kiện từ thread giải: nhịp vẽ tiến độ và báo đã giải xong
+SOLVER_TICK = pygame.USEREVENT + 1
+SOLVER_DONE = pygame.USEREVENT + 2
+PROGRESS_MS = 100
+# GUI giải ngay trong tiến trình này (để vẽ tiến độ và huỷ được), mà tiến trình đã giải trước đó
+# dùng lại bộ nhớ cũ nên RSS gần như không tăng: không đo RSS ở đây, số liệu bộ nhớ lấy từ solve.py.
+# Đặt TRACEMALLOC để đo chính xác trong GUI (chậm hơn nhiều)
+MEMORY_MODE = OFF
+# Phím vẫn xử lý trong lúc đang giải, các phím khác bị bỏ qua
+SOLVING_KEYS = (Key.QUIT, 'RESET', 'ECS', 'CANCEL', 'PROGRESS', 'SOLVED')
 
 class GameEngine:
     @staticmethod
@@ -97,16 +47,19 @@ class GameEngine:
 
         next_tile = world.get(next_pos)
         push_tile = world.get(push_pos)
+        # Trả về các ô đã thay đổi để chỉ vẽ lại các ô đó
         if next_tile.wall:
-            return
+            return ()
 
         if next_tile.stone:
             if not push_tile.wall and not push_tile.stone:
                 world.push_stone(next_pos, push_pos)
                 world.move_ares(next_pos)
-            return
+                return (r, c), next_pos, push_pos
+            return ()
 
         world.move_ares(next_pos)
+        return (r, c), next_pos
 
     @staticmethod
     def is_game_over(world):
@@ -124,10 +77,29 @@ class GameView:
         self._screen = None  
         self._images = {}  
         self._done = False 
+        self._fonts = {}  # cỡ chữ -> Font, tạo Font mới mỗi lần vẽ là nạp lại file font
+        self._glyphs = {}  # trọng số -> chữ đã render
+        self._drawn = {}  # ô -> (tile, trọng số) đang hiển thị, rỗng thì lần vẽ sau vẽ lại toàn bộ
         pygame.display.set_caption("Sokoban - Amazing Puzzle Game")
         pygame.display.set_icon(icon)
         self._help = False
 
+    def font(self, size):
+        font = self._fonts.get(size)
+        if font is None:
+            font = self._fonts[size] = pygame.font.Font(None, size)
+        return font
+
+    def weight_glyph(self, weight):
+        glyph = self._glyphs.get(weight)
+        if glyph is None:
+            glyph = self._glyphs[weight] = self.font(36).render(str(weight), True, (255, 255, 255))
+        return glyph
+
+    def invalidate(self):
+        # Màn hình bị vẽ đè (dải tiến độ, bảng chỉ dẫn, thông báo): lần sau vẽ lại toàn bộ
+        self._drawn = {}
+
     def init_show_help(self, world):
         icon_size = 40  
         self.menu_rect = pygame.Rect(world.ncols * GameView.TILE_SIZE - icon_size - 10, 10, icon_size, icon_size)
@@ -136,7 +108,7 @@ class GameView:
         #Hiển thị bảng chỉ dẫn 
         if self._help:
             screen_width, screen_height = self._screen.get_size()
-            box_width, box_height = 500, 380
+            box_width, box_height = 500, 510
             box_x = (screen_width - box_width) // 2
             box_y = (screen_height - box_height) // 2
 
@@ -147,11 +119,11 @@ class GameView:
             pygame.draw.rect(self._screen, (240, 240, 240), (box_x, box_y, box_width, box_height), border_radius=15)
             pygame.draw.rect(self._screen, (50, 50, 50), (box_x, box_y, box_width, box_height), 3, border_radius=15)
 
-            title_font = pygame.font.Font(None, 36)
+            title_font = self.font(36)
             title_text = title_font.render("How to Play", True, (0, 0, 0))
             self._screen.blit(title_text, (box_x + 20, box_y + 15))  # Căn trái
 
-            font = pygame.font.Font(None, 28)
+            font = self.font(28)
             options = [
                 "Arrow keys: Move character",
                 "Move all boxes to the goals",
@@ -161,7 +133,12 @@ class GameView:
                 "Press 3: DFS Algorithm",
                 "Press 4: Dijkstra Algorithm",
                 "Press 5: GBFS Algorithm",
-                "Press 6: UCS Algorithm"
+                "Press 6: UCS Algorithm",
+                "Press 7: Race all algorithms",
+                "Press 8: IDA* Algorithm",
+                "Press 9: Bidirectional push/pull search",
+                "Press 0: Anytime ARA* (best in 30 s)",
+                "Press C: Cancel solving"
             ]
 
             # Vẽ nội dung căn trái
@@ -180,6 +157,7 @@ class GameView:
             close_text_rect = close_text.get_rect(center=self.close_btn.center)
             self._screen.blit(close_text, close_text_rect)
 
+            self.invalidate()
             pygame.display.flip()
 
 
@@ -207,44 +185,74 @@ class GameView:
         height = world.nrows * GameView.TILE_SIZE
         self._screen = pygame.display.set_mode((width, height))
         self.init_show_help(world)
+        self.invalidate()
 
-    def show_world(self, world):  
-        self._screen.fill((255, 0, 0))  
-        font = pygame.font.Font(None, 36)  
-        for i in range(world.nrows):  
-            for j in range(world.ncols):  
-                tile = world.get((i, j))  
-                sx = j * GameView.TILE_SIZE  
-                sy = i * GameView.TILE_SIZE  
-                img = self._images[tile]  
-                self._screen.blit(img, (sx, sy))  
-        
+    def draw_cell(self, world, pos):
+        # Vẽ một ô (kèm trọng số nếu có stone), trả về vùng đã vẽ hoặc None nếu ô không đổi
+        tile = world.get(pos)
+        weight = world.stone_weights_map.get(pos, 0) if tile.stone else None
+        if self._drawn.get(pos) == (tile, weight):
+            return None
+        self._drawn[pos] = (tile, weight)
+        sx = pos[1] * GameView.TILE_SIZE
+        sy = pos[0] * GameView.TILE_SIZE
+        rect = self._screen.blit(self._images[tile], (sx, sy))
         # Hiển thị trọng số trên stone
-        for stone in world.boxes:
-            if stone in world.stone_weights_map:
-                weight = world.stone_weights_map[stone]
-            else:
-                weight = 0
-            text = font.render(str(weight), True, (255, 255, 255))
-            text_rect = text.get_rect(center=(stone[1] * GameView.TILE_SIZE + 32, stone[0] * GameView.TILE_SIZE + 32 - 11.5))
-            self._screen.blit(text, text_rect)
-
-        pygame.display.flip()
+        if weight is not None:
+            text = self.weight_glyph(weight)
+            self._screen.blit(text, text.get_rect(center=(sx + 32, sy + 32 - 11.5)))
+        return rect
 
+    def draw_menu_icon(self):
         # Vẽ icon `?` với viền trong suốt
         icon_radius = 20  # Bán kính icon
         pygame.draw.circle(self._screen, (255, 255, 255, 150), self.menu_rect.center, icon_radius)  # Nền trong suốt
         pygame.draw.circle(self._screen, (0, 0, 0), self.menu_rect.center, icon_radius, 2)  # Viền đen
 
         # Vẽ dấu `?`
-        font = pygame.font.Font(None, 36)
-        text = font.render("?", True, (0, 0, 0))  
+        text = self.font(36).render("?", True, (0, 0, 0))
         text_rect = text.get_rect(center=self.menu_rect.center)
         self._screen.blit(text, text_rect)
 
-        # Hiển thị menu trợ giúp nếu đang bật
-        self.show_help()
+    def show_world(self, world, cells=None):
+        # Chỉ vẽ lại các ô khác với lần vẽ trước (trong cells nếu có, vd. các ô một bước đi chạm tới)
+        # và chỉ cập nhật các vùng đó lên màn hình. Bảng chỉ dẫn phủ lên cả bàn chơi nên khi bật thì vẽ lại toàn bộ
+        if self._help or not self._drawn:
+            self.show_full_world(world)
+            return
+        if cells is None:
+            cells = [(i, j) for i in range(world.nrows) for j in range(world.ncols)]
+        rects = [rect for rect in (self.draw_cell(world, pos) for pos in cells) if rect is not None]
+        if not rects:
+            return
+        if self.menu_rect.collidelist(rects) >= 0:
+            self.draw_menu_icon()
+            rects.append(self.menu_rect)
+        pygame.display.update(rects)
+
+    def show_full_world(self, world):
+        self._screen.fill((255, 0, 0))  
+        self._drawn = {}
+        for i in range(world.nrows):  
+            for j in range(world.ncols):  
+                self.draw_cell(world, (i, j))
+        self.draw_menu_icon()
+
+        # Hiển thị menu trợ giúp nếu đang bật (đã tự flip)
+        if self._help:
+            self.show_help()
+        else:
+            pygame.display.flip()
 
+    def show_overlay(self, text):
+        # Dải thông tin ở cuối màn hình, dùng khi đang giải
+        screen_width, screen_height = self._screen.get_size()
+        label = self.font(24).render(text, True, (255, 255, 255))
+        strip = pygame.Surface((screen_width, label.get_height() + 12), pygame.SRCALPHA)
+        strip.fill((0, 0, 0, 170))
+        self._screen.blit(strip, (0, screen_height - strip.get_height()))
+        self._screen.blit(label, (8, screen_height - strip.get_height() + 6))
+        self.invalidate()
         pygame.display.flip()
 
     def quit(self):  
@@ -264,6 +272,11 @@ class GameView:
             pygame.K_4: 'Dijkstra', 
             pygame.K_5: 'GBFS', 
             pygame.K_6: 'UCS', 
+            pygame.K_7: 'PORTFOLIO',
+            pygame.K_8: 'IDASTAR',
+            pygame.K_9: 'Bidirectional',
+            pygame.K_0: 'ARASTAR',
+            pygame.K_c: 'CANCEL',
             pygame.K_ESCAPE : 'ECS'
         }  
         event = pygame.event.wait()  
@@ -274,6 +287,10 @@ class GameView:
                 event_handler.handle_key(key_map[event.key])  
             except KeyError:  
                 pass 
+        elif event.type == SOLVER_TICK:
+            event_handler.handle_key('PROGRESS')
+        elif event.type == SOLVER_DONE:
+            event_handler.handle_key('SOLVED')
         elif event.type == pygame.MOUSEBUTTONDOWN:
             if self._help:
                 # Nếu bấm vào nút Close, tắt bảng chỉ dẫn
@@ -396,6 +413,16 @@ class Sokoban:
         self.algorithm_choice = None
         self.bot_play = False
         self.sfx = sound_manager
+        self.solving = None
+        self.budget = None
+        self.solver_result = None
+        self.solver_record = None
+        self.search_stats = None
+        try:
+            self.cache = SolutionCache()
+        except (OSError, sqlite3.Error):
+            # Không ghi được cache thì vẫn chơi bình thường, chỉ là luôn giải lại
+            self.cache = None
     
     def run(self):
         self.sfx.stop('menu')
@@ -405,8 +432,8 @@ class Sokoban:
         self._view.run(self)
     
     def _move(self, direction):
-        self._engine.move(direction, self._world)
-        self._view.show_world(self._world)
+        cells = self._engine.move(direction, self._world)
+        self._view.show_world(self._world, cells)
 
     def auto_move(self):
         if not self.solution:
@@ -431,41 +458,143 @@ class Sokoban:
             f.write(f"Weight: {self.weight} \n")
             f.write(f"Node: {self.node} \n")
             f.write(f"Time (ms) : {self.time:.3f}  \n")
-            f.write(f"Memory (MB): {self.memory:.2f}  \n")
+            f.write(f"Memory (MB): {self.memory:.2f}  \n" if self.memory is not None else "Memory (MB): n/a  \n")
             f.write(f"Solution: {self.solution} \n")
             f.write("\n")
             
     def solve_with_algorithm(self, algorithm_class, algorithm_name):
-        new_grid = check_and_pad_map(self._world.grid)
-        solver = algorithm_class(
-            new_grid,
-            tuple(self._world.player_pos[0]),
-            [tuple(pos) for pos in self._world.boxes],
-            [tuple(pos) for pos in self._world.goals],
-            self._world.stone_weights
-        )
-        tracemalloc.start()
-        start_time = time.perf_counter()
-        node_generated, total_weight, solution = solver.runner()
-        current, peak = tracemalloc.get_traced_memory()
-        tracemalloc.stop()
-        end_time = time.perf_counter()
+        key = solution_key(self._world, algorithm_name)
+        record = self.cache.get(key) if self.cache is not None else None
+        if record is not None:
+            # Trạng thái này đã được giải: phát lại lời giải ngay, không tìm lại
+            self.play_solution(algorithm_name, record['nodes'], record['cost'] or 0,
+                               record['solution'] or "NoSol", record['time_ms'], record['memory_mb'])
+            return
+        solver = make_solver(self._world, algorithm_class)
+        self.search_stats = solver.stats
+        # Giữ giới hạn mặc định của thuật toán (nếu có), nút C huỷ qua chính budget đó
+        self.start_solving(algorithm_name, solver.budget or Budget(), self.run_solver, solver, key)
+
+    def solve_portfolio(self):
+        # Chạy đua mọi thuật toán trên process pool, lấy lời giải đầu tiên
+        self.search_stats = None
+        self.start_solving('Portfolio', Budget(), self.run_portfolio)
+
+    def start_solving(self, algorithm_name, budget, target, *args):
+        # Giải trên thread nền để cửa sổ vẫn nhận input, kết quả quay về qua SOLVER_DONE
+        self.budget = budget
+        self.solving = algorithm_name
+        self.solver_result = None
+        self.solver_record = None
+        threading.Thread(target=target, args=(algorithm_name, budget) + args, daemon=True).start()
+        pygame.time.set_timer(SOLVER_TICK, PROGRESS_MS)
+        self.show_progress()
+
+    def run_solver(self, algorithm_name, budget, solver, key):
+        try:
+            meter = MemoryMeter(MEMORY_MODE)
+            meter.start()
+            start_time = time.perf_counter()
+            # Hết giờ / quá số node / hết bộ nhớ đều trả về status, không còn lời giải
+            result = run(solver, budget)
+            end_time = time.perf_counter()
+            peak = meter.stop()
+            memory_mb = round(peak / (1024 ** 2), 3) if peak is not None else None
+            solved = result.status == SOLVED
+            bound = getattr(solver, "bound", None) if solved else None
+            # ARA*: ghi kèm bound đạt được (1.00 = tối ưu) vào tên thuật toán
+            label = f"{algorithm_name} (bound {bound:.2f})" if bound is not None else algorithm_name
+            self.solver_result = (label, result.nodes, result.cost or 0, result.solution or "NoSol",
+                                  (end_time - start_time)*1000, memory_mb)
+            # Cùng dạng record với solve.py để GUI và chạy headless dùng chung cache
+            self.solver_record = (key, {
+                "algorithm": algorithm_name,
+                "status": result.status,
+                "solved": solved,
+                "nodes": result.nodes,
+                "cost": result.cost,
+                "steps": len(result.solution) if solved else None,
+                "time_ms": round((end_time - start_time) * 1000, 3),
+                "memory_mb": memory_mb,
+                "solution": result.solution,
+            })
+            if bound is not None:
+                self.solver_record[1]["bound"] = round(bound, 4)
+        except Exception:
+            self.solver_failed(algorithm_name)
+        finally:
+            # Luôn báo về thread chính, nếu không self.solving kẹt mãi và bàn phím bị bỏ qua
+            pygame.event.post(pygame.event.Event(SOLVER_DONE))
+
+    def run_portfolio(self, algorithm_name, budget):
+        try:
+            start_time = time.perf_counter()
+            best, _ = solve_portfolio(self._world, budget=budget)
+            end_time = time.perf_counter()
+            if best is None:
+                self.solver_result = (algorithm_name, 0, 0, "NoSol", 0, None)
+            else:
+                self.solver_result = (f"Portfolio ({best['algorithm']})", best['nodes'], best['cost'],
+                                      best['solution'], (end_time - start_time)*1000, best['memory_mb'])
+        except Exception:
+            self.solver_failed(algorithm_name)
+        finally:
+            pygame.event.post(pygame.event.Event(SOLVER_DONE))
+
+    def solver_failed(self, algorithm_name):
+        # Lỗi của solver không có lời giải và không được ghi vào cache
+        traceback.print_exc()
+        self.solver_result = (algorithm_name, 0, 0, "NoSol", 0, None)
+        self.solver_record = None
+
+    def show_progress(self):
+        budget = self.budget
+        stats = self.search_stats
+        # Tốc độ mở rộng theo định nghĩa chung của SearchStats (portfolio không có)
+        rate = f" | {stats.expanded / budget.elapsed:,.0f} exp/s" if stats is not None and budget.elapsed else ""
+        self._view.show_world(self._world)
+        self._view.show_overlay(f"{self.solving}: {budget.nodes:,} nodes | frontier {budget.frontier:,}"
+                                f"{rate} | {budget.elapsed:.1f} s | C: cancel")
+
+    def cancel_solving(self):
+        if self.solving:
+            self.budget.cancel()
+
+    def finish_solving(self):
+        pygame.time.set_timer(SOLVER_TICK, 0)
+        self.solving = None
+        if self.budget.cancelled:
+            self._view.show_world(self._world)
+            return
+        # Ghi cache trên thread chính, thread giải không đụng tới SQLite
+        if self.solver_record is not None and self.cache is not None:
+            self.cache.put(*self.solver_record)
+        self.play_solution(*self.solver_result)
+
+    def play_solution(self, algorithm_name, node_generated, total_weight, solution, time_ms, memory_mb):
         if solution != "NoSol" and solution != None:
             self.bot_play = True
             self. algorithm_choice =  algorithm_name
             self.steps = len(solution)
             self.weight = total_weight
             self.node = node_generated
-            self.time = (end_time - start_time)*1000
-            self.memory = peak/(1024**2)
+            self.time = time_ms
+            self.memory = memory_mb
             self.solution = solution
             self.write_output()
             self.auto_move()
         else:
             display_msg = DisplayMSG(self._view._screen,self.sfx)
             display_msg.show_end_MSG(self)
+            self._view.invalidate()
 
     def handle_key(self, key):
+        if self.solving and key not in SOLVING_KEYS:
+            return
+        if key == 'PROGRESS':
+            if self.solving:
+                self.show_progress()
+            return
         if key == Key.QUIT:
             self._view.quit()
             pygame.quit()
@@ -479,8 +608,15 @@ class Sokoban:
         elif key == Key.DOWN:
             self._move(Dir.DN)
         elif key == 'RESET':
+            self.cancel_solving()
             self.reset_game()
+        elif key == 'CANCEL':
+            self.cancel_solving()
+        elif key == 'SOLVED':
+            if self.solving:
+                self.finish_solving()
         elif key == 'ECS':
+            self.cancel_solving()
             self.sfx.stop('background')
             global run_once
             if run_once: run_once = False
@@ -488,20 +624,15 @@ class Sokoban:
             pygame.display.quit()  
             pygame.init()  
             main_menu()
-        elif key in ['BFS', 'DFS', 'UCS', 'ASTAR', 'GBFS', 'Dijkstra']:
-            algorithm_map = {
-                'BFS': BFS.BFS,
-                'DFS': DFS.DFS,
-                'UCS': UCS.UCS,
-                'ASTAR': ASTAR.ASTAR,
-                'GBFS': GBFS.GBFS,  
-                'Dijkstra': Dijkstra.Dijkstra,
-            }
-            self.solve_with_algorithm(algorithm_map[key],key)
+        elif key in ALGORITHMS:
+            self.solve_with_algorithm(ALGORITHMS[key],key)
+        elif key == 'PORTFOLIO':
+            self.solve_portfolio()
 
         if self._engine.is_game_over(self._world):
             display_msg = DisplayMSG(self._view._screen,self.sfx)
             display_msg.show_end_MSG(self)
+            self._view.invalidate()
             waiting = True
             while waiting:
                 for event in pygame.event.get():
@@ -561,24 +692,6 @@ class sfx:
         for sound in self.Sound.values():
             sound.set_volume(volume)
 
-def check_and_pad_map(grid):
-    """
-    Đảm bảo tất cả các dòng của grid có cùng số cột.
-    Nếu dòng nào thiếu, ta sẽ thêm '#' hoặc ' ' (tuỳ ý)
-    để tránh bị lỗi index khi truy cập grid[x][y].
-    """
-    max_len = max(len(row) for row in grid)
-    new_grid = []
-    for row in grid:
-        # Nếu row đang là list, ta nối lại thành string
-        # Trường hợp row đã là string thì không cần đổi
-        # Tuỳ theo cách MapLoader bạn cài đặt
-        if len(row) < max_len:
-            row += "#" * (max_len - len(row))  # hoặc ' ' 
-        new_grid.append(row)
-    return new_grid
-
-
 def main_menu():
     pygame.init() 
     screen = pygame.display.set_mode((800, 600))
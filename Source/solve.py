@@ -0,0 +1,354 @@
+"""
+Headless solver and benchmark runner.
+
+Loads levels through ``World`` (no pygame) and runs any subset of the
+solvers over any set of level files, printing one JSON record per
+(level, algorithm):
+
+    python solve.py                          # every solver on Inputs/*.txt
+    python solve.py -a ASTAR,UCS Inputs/input-03.txt Inputs/Input-07.txt
+    python solve.py -a BFS -o bench.jsonl --no-solution
+    python solve.py --portfolio -a ASTAR,UCS,GBFS --deadline 30
+    python solve.py -a DFS --time-limit 60 --max-nodes 2000000 --max-memory 1024
+    python solve.py -a ARASTAR --time-limit 5
+    python solve.py -a ASTAR,IDASTAR --pdb --pdb-size 3
+    python solve.py -a UCS,GBFS --stats --sample-ms 5 --no-solution
+    python solve.py -a ASTAR --memory tracemalloc Inputs/input-03.txt
+
+With the default ``--memory rss`` every search runs in a fresh child
+process, so its peak RSS is not hidden by memory an earlier search freed.
+
+``--portfolio`` races the selected solvers in a process pool instead and
+prints one record per level for the winner. ``--cache`` reuses results from
+the on-disk solution cache (see cache.py), so a rerun only searches levels
+that changed.
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from Algorithm import ARASTAR, ASTAR, BFS, Bidirectional, DFS, Dijkstra, IDASTAR, UCS, GBFS
+from Algorithm.budget import Budget, SOLVED, run
+from Algorithm.memory import MEMORY_MODES, RSS, MemoryMeter
+from Algorithm.patterns import PATTERN_SIZE, pattern_heuristic
+from Algorithm.state import Board
+from Algorithm.stats import SAMPLE_EVERY
+from cache import CACHE_MAX_BYTES, CACHE_PATH, SolutionCache, solution_key
+from world import World, check_and_pad_map
+
+# How often (s) a portfolio race checks its deadline and cancel flag
+POLL_INTERVAL = 0.1
+
+ALGORITHMS = {
+    'ARASTAR': ARASTAR.ARASTAR,
+    'ASTAR': ASTAR.ASTAR,
+    'BFS': BFS.BFS,
+    'Bidirectional': Bidirectional.Bidirectional,
+    'DFS': DFS.DFS,
+    'Dijkstra': Dijkstra.Dijkstra,
+    'GBFS': GBFS.GBFS,
+    'IDASTAR': IDASTAR.IDASTAR,
+    'UCS': UCS.UCS,
+}
+
+
+def make_solver(world, algorithm_class):
+    return algorithm_class(
+        check_and_pad_map(world.grid),
+        tuple(world.player_pos[0]),
+        [tuple(pos) for pos in world.boxes],
+        [tuple(pos) for pos in world.goals],
+        world.stone_weights
+    )
+
+
+def solution_cost(world, solution):
+    """Walks plus pushed weight, the same for every solver whatever it reports as cost."""
+    board = Board(check_and_pad_map(world.grid), tuple(world.player_pos[0]), world.boxes,
+                  world.goals, world.stone_weights)
+    return board.push_weight(solution) + sum(move.islower() for move in solution)
+
+
+def run_solver(world, algorithm_name, level=None, memory=RSS, limits=None, cache=None, workers=None,
+               backend=None, pdb=None, stats=None, samples=False, isolate=False):
+    """
+    Solve ``world`` with one algorithm and return its record: status, nodes,
+    cost, steps, wall time (ms) and peak memory (MB), as written by the GUI.
+    ``memory`` is a ``MemoryMeter`` mode: "rss" (peak RSS growth, no
+    slowdown), "tracemalloc" (traced peak, slow, plus the MB of the
+    solver's visited / frontier / parents under "memory_structures_mb") or
+    "off" (memory_mb is then None). ``isolate`` runs the search in a fresh
+    child process (see ``run_isolated``), which the "rss" mode needs in any
+    process that already searched.
+    ``limits`` are ``Budget`` keyword arguments; without them the solver
+    keeps its own default budget. With a ``SolutionCache`` a stored record is
+    returned as is (``"cached": true``, timings from the run that stored it)
+    and a fresh one is stored. ``workers`` > 1 runs solvers that support it
+    (BFS) across that many processes once a level does not finish serially
+    within ``PARALLEL_MIN_NODES`` nodes. The workers' RSS growth goes in
+    "worker_memory_mb" and, in the "rss" mode, into memory_mb. ``backend``
+    picks their expansion engine ("python" or "numpy"). ``pdb`` (a pattern
+    size) tightens the heuristic of the A* family with an additive pattern
+    database. Anytime solvers (ARASTAR) add the suboptimality ``bound``
+    their solution reached, 1.0 when proven optimal. With ``stats`` (a
+    sampling period in seconds, 0 for counters only) the record gets the
+    solver's ``SearchStats`` under "stats", plus the sampled rows if
+    ``samples``.
+    """
+    if cache is not None:
+        key = solution_key(world, algorithm_name if not pdb else f"{algorithm_name}+pdb{pdb}")
+        record = cache.get(key)
+        if record is not None:
+            record.pop("level", None)
+            return {"level": level, **record, "cached": True}
+    args = (world, algorithm_name, level, memory, limits, workers, backend, pdb, stats, samples)
+    record = run_isolated(*args) if isolate else solve_record(*args)
+    if cache is not None and "error" not in record:
+        cache.put(key, record)
+        record["cached"] = False
+    return record
+
+
+def run_isolated(*args):
+    """
+    ``solve_record(*args)`` in a fresh child process. A process that already
+    searched keeps the memory it freed and the next search reuses it, so its
+    RSS barely grows and the "rss" mode reads about 0. A child forked from
+    the forkserver (spawned where there is none) starts without that memory.
+    A child that dies gives an error record, as in ``solve_portfolio``.
+    """
+    world, algorithm_name, level = args[:3]
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    try:
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context(method)) as pool:
+            return pool.submit(solve_record, *args).result()
+    except BrokenProcessPool as e:
+        return {"level": level, "algorithm": algorithm_name, "solved": False, "error": repr(e)}
+
+
+def solve_record(world, algorithm_name, level=None, memory=RSS, limits=None, workers=None, backend=None,
+                 pdb=None, stats=None, samples=False):
+    """One search in this process, for ``run_solver`` (same arguments, no cache)."""
+    solver = make_solver(world, ALGORITHMS[algorithm_name])
+    if workers and hasattr(solver, "workers"):
+        solver.workers = workers
+    if backend and hasattr(solver, "backend"):
+        solver.backend = backend
+    if pdb and hasattr(solver, "heuristic"):
+        solver.heuristic = pattern_heuristic(solver.board, solver.pushDistance, pdb)
+    if stats is not None:
+        solver.stats.sample_every = stats
+    meter = MemoryMeter(memory)
+    meter.watch(solver.stats)
+    meter.start()
+    start_time = time.perf_counter()
+    result = run(solver, Budget(**limits) if limits else None)
+    end_time = time.perf_counter()
+    peak = meter.stop()
+    worker_memory = getattr(solver, "worker_memory", None)
+    if worker_memory is not None and memory == RSS and peak is not None:
+        # Worker processes grow their own RSS: count it with the coordinator's
+        peak += worker_memory
+    solved = result.status == SOLVED
+    record = {
+        "level": level,
+        "algorithm": algorithm_name,
+        "status": result.status,
+        "solved": solved,
+        "nodes": result.nodes,
+        "cost": result.cost,
+        "steps": len(result.solution) if solved else None,
+        "time_ms": round((end_time - start_time) * 1000, 3),
+        "memory_mb": round(peak / (1024 ** 2), 3) if peak is not None else None,
+        "solution": result.solution,
+    }
+    if solved and getattr(solver, "bound", None) is not None:
+        record["bound"] = round(solver.bound, 4)
+    if worker_memory is not None:
+        record["worker_memory_mb"] = round(worker_memory / (1024 ** 2), 3)
+    if meter.structures is not None:
+        record["memory_structures_mb"] = {name: round(size / (1024 ** 2), 3)
+                                          for name, size in meter.structures.items()}
+    if stats is not None:
+        record["stats"] = solver.stats.as_dict(samples)
+        if hasattr(solver, "details"):
+            record["stats"]["details"] = solver.details()
+    return record
+
+
+def solve_portfolio(world, algorithms=None, deadline=None, level=None, budget=None, limits=None):
+    """
+    Race ``algorithms`` (default: all) on ``world``, one pool process each.
+
+    Without a deadline the first valid solution wins. With ``deadline``
+    (seconds) the race runs until every solver finished or time is up and
+    the cheapest solution by ``solution_cost`` wins. Either way the
+    remaining workers are terminated before returning. Cancelling
+    ``budget`` stops the race early. ``limits`` go to every solver as in
+    ``run_solver``.
+    Returns ``(best, records)``: the winning record or None, and the record
+    of every solver that finished.
+    """
+    algorithms = list(algorithms or ALGORITHMS)
+    finished = queue.Queue()
+    end = None if deadline is None else time.monotonic() + deadline
+    # spawn, not fork: the GUI process has SDL threads running and a forked
+    # child can inherit one of their locks held
+    pool = multiprocessing.get_context("spawn").Pool(len(algorithms))
+    try:
+        for name in algorithms:
+            pool.apply_async(run_solver, (world, name, level, RSS, limits), callback=finished.put,
+                             error_callback=lambda e, name=name: finished.put(
+                                 {"level": level, "algorithm": name, "solved": False, "error": repr(e)}))
+        best = None
+        records = []
+        while len(records) < len(algorithms):
+            if end is not None and time.monotonic() >= end:
+                break
+            if budget is not None and budget.cancelled:
+                break
+            try:
+                record = finished.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            records.append(record)
+            if not record["solved"]:
+                continue
+            record["solution_cost"] = solution_cost(world, record["solution"])
+            if best is None or record["solution_cost"] < best["solution_cost"]:
+                best = record
+            if end is None:
+                break
+        return best, records
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def portfolio_record(world, algorithms, deadline, level, limits=None):
+    start_time = time.perf_counter()
+    best, records = solve_portfolio(world, algorithms, deadline, level, limits=limits)
+    record = dict(best) if best else {"level": level, "algorithm": None, "solved": False}
+    record["portfolio"] = list(algorithms)
+    record["finished"] = [r["algorithm"] for r in records]
+    record["wall_ms"] = round((time.perf_counter() - start_time) * 1000, 3)
+    return record
+
+
+def algorithm_list(text):
+    names = [name for name in text.split(",") if name]
+    for name in names:
+        if name not in ALGORITHMS:
+            raise argparse.ArgumentTypeError(f"unknown algorithm {name!r}")
+    return names
+
+
+def pattern_size(text):
+    size = int(text)
+    if size < 2:
+        raise argparse.ArgumentTypeError(f"a pattern needs at least 2 boxes, got {size}")
+    return size
+
+
+def parse_args(argv=None):
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Run Sokoban solvers without the GUI.")
+    parser.add_argument("levels", nargs="*",
+                        help="level files (default: Inputs/*.txt)")
+    parser.add_argument("-a", "--algorithms", type=algorithm_list, default=list(ALGORITHMS),
+                        metavar="ALG[,ALG...]",
+                        help="solvers to run, comma separated: " + ",".join(ALGORITHMS))
+    parser.add_argument("-o", "--output",
+                        help="append records to this file instead of stdout")
+    parser.add_argument("--no-solution", action="store_true",
+                        help="leave the move string out of the records")
+    parser.add_argument("--portfolio", action="store_true",
+                        help="race the solvers in parallel, one record per level")
+    parser.add_argument("--deadline", type=float,
+                        help="with --portfolio: keep racing this many seconds, take the cheapest")
+    parser.add_argument("--time-limit", type=float, metavar="SECONDS",
+                        help="stop each search after this much wall time")
+    parser.add_argument("--max-nodes", type=int,
+                        help="stop each search after generating this many nodes")
+    parser.add_argument("--max-memory", type=float, metavar="MB",
+                        help="stop each search once the process grew by this much RSS")
+    parser.add_argument("--workers", type=int,
+                        help="expand BFS layers in this many processes (not with --portfolio)")
+    parser.add_argument("--backend", choices=("python", "numpy"),
+                        help="BFS expansion engine: one state at a time or whole layers in NumPy")
+    parser.add_argument("--pdb", action="store_true",
+                        help="A* family: tighten the heuristic with a pattern database stored under .cache/patterns")
+    parser.add_argument("--pdb-size", type=pattern_size, default=PATTERN_SIZE, metavar="BOXES",
+                        help=f"with --pdb: boxes per pattern (default {PATTERN_SIZE})")
+    parser.add_argument("--stats", action="store_true",
+                        help="add search counters and the movegen / heuristic / bookkeeping time split")
+    parser.add_argument("--sample-ms", type=float, default=SAMPLE_EVERY * 1000, metavar="MS",
+                        help=f"with --stats: sample the time split every MS ms (default {SAMPLE_EVERY * 1000:g}, "
+                             "0: counters only)")
+    parser.add_argument("--samples", action="store_true",
+                        help="with --stats: also write the sampled counter rows, for charts")
+    parser.add_argument("--memory", choices=MEMORY_MODES, default=RSS,
+                        help="how to measure peak memory: rss (default, no slowdown), tracemalloc (slow, "
+                             "adds the size of visited / frontier / parents) or off")
+    parser.add_argument("--in-process", action="store_true",
+                        help="with --memory rss: run every search in this process instead of a fresh child "
+                             "(memory then reads about 0 after the first large search)")
+    parser.add_argument("--cache", action="store_true",
+                        help="reuse and store results in the on-disk solution cache")
+    parser.add_argument("--cache-path", default=CACHE_PATH,
+                        help=f"solution cache file (default: {os.path.relpath(CACHE_PATH, here)})")
+    parser.add_argument("--cache-size", type=float, default=CACHE_MAX_BYTES / 1024 ** 2, metavar="MB",
+                        help="evict least recently used results past this size")
+    args = parser.parse_args(argv)
+    if not args.levels:
+        args.levels = sorted(glob.glob(os.path.join(here, "Inputs", "*.txt")))
+    return args
+
+
+def budget_limits(args):
+    """Budget keyword arguments from the command line, None when no limit was given."""
+    limits = {
+        "time_limit": args.time_limit,
+        "max_nodes": args.max_nodes,
+        "max_memory": int(args.max_memory * 1024 ** 2) if args.max_memory is not None else None,
+    }
+    return limits if any(value is not None for value in limits.values()) else None
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    limits = budget_limits(args)
+    cache = SolutionCache(args.cache_path, int(args.cache_size * 1024 ** 2)) if args.cache else None
+    out = open(args.output, "a") if args.output else sys.stdout
+    try:
+        for filename in args.levels:
+            level = os.path.basename(filename)
+            if args.portfolio:
+                records = [portfolio_record(World(filename), args.algorithms, args.deadline, level, limits)]
+            else:
+                records = (run_solver(World(filename), name, level, limits=limits, cache=cache,
+                                      workers=args.workers, backend=args.backend,
+                                      pdb=args.pdb_size if args.pdb else None,
+                                      stats=args.sample_ms / 1000 if args.stats else None,
+                                      samples=args.samples, memory=args.memory,
+                                      isolate=args.memory == RSS and not args.in_process)
+                           for name in args.algorithms)
+            for record in records:
+                if args.no_solution:
+                    record.pop("solution", None)
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Level loading without pygame, shared by the GUI (main.py) and the headless
+runner (solve.py).
+"""
+from collections import namedtuple
+import sys
+
+Tile = namedtuple("Tile", "wall ares goal stone")
+
+
+class World:
+    def __init__(self, filename):
+        try:
+            with open(filename, "r") as f:
+                lines = f.readlines()
+            self.stone_weights = list(map(int, lines[0].split()))
+            self.grid = [list(line.rstrip("\n")) for line in lines[1:]]
+            self.player_pos = []
+            self.boxes = []
+            self.goals = []
+            self.wall_pos = []
+            self.nrows = 0
+            self.ncols = 0
+            for i, line in enumerate(lines[1:]):
+                row = line.rstrip()
+                for j, tile in enumerate(row):
+                    pos = (i, j)
+                    if tile in ('@', '+'):
+                        self.player_pos.append(pos)
+                    if tile in ('$', '*'):
+                        self.boxes.append(pos)
+                    if tile in ('.', '*', '+'):
+                        self.goals.append(pos)
+                    if tile == '#':
+                        self.wall_pos.append(pos)
+            
+            self.stone_weights_map = {}
+            self.stone_weights_map = {}
+            for i in range(len(self.boxes)):            
+                self.stone_weights_map[self.boxes[i]] = self.stone_weights[i]
+            # để debug đảm bảo input vào là đúng
+            '''for row in self.grid:
+                print(row)
+            print("Player Position:", self.player_pos)
+            print("Boxes:", self.boxes)
+            print("Goals:", self.goals)
+            print("Box Weights:", self.stone_weights)
+            print(self.stone_weights_map)'''
+        except (OSError, IOError):
+            print("sokoban: loading levels from text file failed!", file=sys.stderr)
+            exit(1)
+        self.load_size()
+
+    def load_size(self):
+        self.nrows = len(self.grid)
+        self.ncols = max(len(row) for row in self.grid) if self.grid else 0
+
+    def get(self, pos):
+        return Tile(wall = (pos in self.wall_pos),
+                    ares = (pos in self.player_pos),
+                    goal = (pos in self.goals),
+                    stone = (pos in self.boxes))
+
+    def push_stone(self, from_pos, to_pos):
+        if from_pos in self.boxes:
+            self.boxes.remove(from_pos)
+            self.boxes.append(to_pos)
+
+            self.stone_weights_map[to_pos] = self.stone_weights_map.pop(from_pos)
+
+    def move_ares(self, to_pos):
+        self.player_pos = [to_pos]
+
+
+def check_and_pad_map(grid):
+    """
+    Đảm bảo tất cả các dòng của grid có cùng số cột.
+    Nếu dòng nào thiếu, ta sẽ thêm '#' hoặc ' ' (tuỳ ý)
+    để tránh bị lỗi index khi truy cập grid[x][y].
+    """
+    max_len = max(len(row) for row in grid)
+    new_grid = []
+    for row in grid:
+        # Nếu row đang là list, ta nối lại thành string
+        # Trường hợp row đã là string thì không cần đổi
+        # Tuỳ theo cách MapLoader bạn cài đặt
+        if len(row) < max_len:
+            row += "#" * (max_len - len(row))  # hoặc ' ' 
+        new_grid.append(row)
+    return new_grid